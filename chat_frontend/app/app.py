@@ -3,6 +3,7 @@ from googleapiclient.errors import HttpError
 from handlers import YouTubeHandler
 from utils import load_config, plot_sentiment_pie, get_avatar, format_duration
 import requests
+import json
 from html_templates import css
 
 config = load_config()
@@ -45,10 +46,11 @@ def render_sidebar():
     set_transcript_button = None
     set_comments_button = None
     analyze_sentiment_button = None
+    refresh_comments_button = None
 
     youtube_handler = None
     if "api_key" in st.session_state:
-        youtube_handler = YouTubeHandler(st.session_state.api_key)
+        youtube_handler = get_youtube_handler(st.session_state.api_key)
         st.session_state.youtube_handler = youtube_handler
     
     # Inicializar botones adicionales y colocarlos en una fila
@@ -67,6 +69,8 @@ def render_sidebar():
         st.sidebar.write(f"{description}")
         st.sidebar.write(f"Published on {publish_date}")
         analyze_sentiment_button = st.sidebar.button("Analyse Sentiment of Comments")
+        if "session_key" in st.session_state:
+            refresh_comments_button = st.sidebar.button("Refresh comments")
     else:
         st.sidebar.write("Enter the link to the video to enable processing")
 
@@ -85,6 +89,10 @@ def render_sidebar():
         else:
             st.error("No API Key or video link has been configured")
 
+    # Añadir los comentarios nuevos a la sesión existente
+    if refresh_comments_button:
+        refresh_session(st.session_state.youtube_handler, st.session_state.video_url)
+
     # Obtener transcripción
     if set_transcript_button:
         show_transcript(st.session_state.video_url)
@@ -111,7 +119,7 @@ def render_chat():
         st.session_state.messages = []
 
     # Cargar historial de chat si es la primera vez
-    if not st.session_state.messages:
+    if st.session_state.get("history_loaded_for") != st.session_state.session_key:
         load_chat_history()
 
     # Mostrar mensajes cargados
@@ -126,47 +134,69 @@ def render_chat():
         with st.chat_message(name="human", avatar=get_avatar("human")):
             st.write(user_input)
         
-        with st.spinner('Esperando respuesta...'):
-            llm_response = send_question(user_input)
         with st.chat_message(name="ai", avatar=get_avatar("ai")):
-            st.write(llm_response)
+            llm_response = stream_question(user_input)
         
         st.session_state.messages.append(("human", user_input))
         st.session_state.messages.append(("ai", llm_response))
  
+# Streamlit reruns the whole script on every interaction: the YouTube client and the
+# data that only changes when a session is (re)ingested are cached across reruns.
+@st.cache_resource(show_spinner=False)
+def get_youtube_handler(api_key):
+    return YouTubeHandler(api_key, **config['youtube'])
+
+@st.cache_data(ttl=config['cache']['video_details_ttl'], show_spinner=False)
+def load_video_details(_youtube_handler, video_id, _video_url):
+    """
+    Video details stored by the backend, or from the YouTube API for videos not ingested yet.
+    Cached by video id; failures raise so they are not cached.
+    """
+    response = requests.get(f"{config['backend_url']}/get-video-details", params={"videlo_url": _video_url})
+    response.raise_for_status()
+    details = response.json().get("details")
+    if details:
+        return (details.get('video_title'), details.get('channel_title'), details.get('description'),
+                details.get('publish_date'), details.get('duration'))
+    video_details = _youtube_handler.extract_video_details(_youtube_handler.get_video_details(video_id))
+    return (video_details['title'], video_details['channel_title'], video_details['description'],
+            video_details['published_at'], video_details['duration'])
+
+@st.cache_data(ttl=config['cache']['transcript_ttl'], show_spinner=False)
+def load_transcript(video_id, _video_url):
+    response = requests.get(f"{config['backend_url']}/get-transcript", params={"videlo_url": _video_url})
+    response.raise_for_status()
+    return response.json().get("transcript")
+
+def invalidate_session_cache(video_id, video_url):
+    """Drop the cached data of a video after its session is (re)ingested, other videos keep theirs"""
+    # Underscore arguments are not part of the cache key, any value selects the same entry
+    load_video_details.clear(None, video_id, video_url)
+    load_transcript.clear(video_id, video_url)
+    st.session_state.pop("history_loaded_for", None)
+
 def get_video_details(youtube_handler, video_url):
     try:
-        response = requests.get(f"{config['backend_url']}/get-video-details", params={"videlo_url": video_url})
-        if response.status_code == 200:
-            details = response.json().get("details")
-            if details:
-                video_title = details.get('video_title')
-                channel_title = details.get('channel_title')
-                description = details.get('description')
-                publish_date = details.get('publish_date')
-                duration = details.get('duration')
-            else:
-                video_id = youtube_handler.extract_video_id(video_url)
-                video_details = youtube_handler.extract_video_details(youtube_handler.get_video_details(video_id))
-                video_title = video_details['title']
-                channel_title = video_details['channel_title']
-                description = video_details['description']
-                publish_date = video_details['published_at']
-                duration = video_details['duration']
-            return video_title, channel_title, description, publish_date, duration
-        else:
-            return "", "", "", "", ""
+        video_id = YouTubeHandler.extract_video_id(video_url)
+        return load_video_details(youtube_handler, video_id, video_url)
     except Exception as e:
         st.sidebar.error(f"An error occurred in obtaining details of the video: {str(e)}")
         return "", "", "", "", ""    
              
 def add_session(youtube_handler, video_url):
     try:
-        transcript = get_transcript(youtube_handler, video_url)
-        comments = get_comments(youtube_handler, video_url)
         video_id = youtube_handler.extract_video_id(video_url)
-        video_details = youtube_handler.get_video_details(video_id)
-        video_info = youtube_handler.extract_video_details(video_details)
+        # Transcript, details and comment pages are fetched concurrently
+        data = youtube_handler.fetch_video_data(video_id)
+        if "details" in data["errors"]:
+            raise data["errors"]["details"]
+        if "transcript" in data["errors"]:
+            st.error(f"Error getting the transcript: {str(data['errors']['transcript'])}")
+        if "comments" in data["errors"]:
+            st.error(f"Error getting comments: {str(data['errors']['comments'])}")
+        transcript = format_transcript(youtube_handler, data["transcript"])
+        comments = format_comments(youtube_handler, data["comments"])
+        video_info = youtube_handler.extract_video_details(data["details"])
         json={
                 "video_url": video_url,
                 "video_title":video_info.get('title',''),
@@ -181,6 +211,7 @@ def add_session(youtube_handler, video_url):
         response = requests.post(f"{config['backend_url']}/add-session", json=json)
         if response.status_code == 200:
             st.session_state.session_key = response.json().get("session_id")
+            invalidate_session_cache(video_id, video_url)
             st.success("Session successfully logged in and data added.")
             # Recargar el historial del chat
             load_chat_history()
@@ -189,13 +220,32 @@ def add_session(youtube_handler, video_url):
     except Exception as e:
         st.sidebar.error(f"An error occurred adding session: {str(e)}")
 
+def refresh_session(youtube_handler, video_url):
+    with st.spinner('Fetching new comments...'):
+        try:
+            response = requests.get(f"{config['backend_url']}/get-latest-comment-time", params={"videlo_url": video_url})
+            response.raise_for_status()
+            since = response.json().get("latest_published_at")
+            video_id = youtube_handler.extract_video_id(video_url)
+            # Newest first, paging stops at the latest stored comment
+            comments = format_comments(youtube_handler, youtube_handler.get_youtube_comments(video_id, since=since))
+            if not comments:
+                st.sidebar.info("No new comments.")
+                return
+            response = requests.post(f"{config['backend_url']}/refresh-session",
+                                     json={"video_url": video_url, "comments": comments})
+            response.raise_for_status()
+            st.sidebar.success(f"{response.json().get('new_comments')} new comments added.")
+        except Exception as e:
+            st.sidebar.error(f"An error occurred refreshing the comments: {str(e)}")
+
 def validate_api_key(youtube_handler, api_key):
     if not api_key:
         st.sidebar.warning("No API key has been entered. Enter an API key to use YouTube features.")
     else:
         try:
             test_video_id = "Ks-_Mh1QhMc"
-            request = youtube_handler.youtube.videos().list(part="snippet", id=test_video_id)
+            request = youtube_handler.client.videos().list(part="id", id=test_video_id)
             response = request.execute()
             st.sidebar.success("Valid API key.")
         except HttpError as e:
@@ -224,13 +274,13 @@ def validate_video_url(youtube_handler, video_url):
         
 def show_transcript(video_url):
     with st.spinner('Loading the transcript...'):
-        response = requests.get(f"{config['backend_url']}/get-transcript", params={"videlo_url": video_url})
-        if response.status_code == 200:
-            transcript = response.json().get("transcript")
+        try:
+            video_id = YouTubeHandler.extract_video_id(video_url)
+            transcript = load_transcript(video_id, video_url)
             st.write("### Video transcript")
             st.write(transcript)
-        else:
-            st.error(f"Error loading transcript: {response.text}")
+        except Exception as e:
+            st.error(f"Error loading transcript: {str(e)}")
 
 def show_comments(video_url):
     with st.spinner('Loading comments...'):
@@ -246,20 +296,17 @@ def show_comments(video_url):
         else:
             st.error(f"Error loading comments: {response.text}")
 
-def get_transcript(youtube_handler, video_url):
+def format_transcript(youtube_handler, transcript):
+    if not transcript:
+        return ""
     try:
-        video_id = youtube_handler.extract_video_id(video_url)
-        transcript = youtube_handler.get_transcript(video_id)
-        full_text_transcript = youtube_handler.get_full_transcript_text(transcript)
-        return full_text_transcript
+        return youtube_handler.get_full_transcript_text(transcript)
     except Exception as e:
         st.error(f"Error getting the transcript: {str(e)}")
         return ""
 
-def get_comments(youtube_handler, video_url):
+def format_comments(youtube_handler, comments):
     try:
-        video_id = youtube_handler.extract_video_id(video_url)
-        comments = youtube_handler.get_youtube_comments(video_id)
         comment_details = youtube_handler.extract_comment_details(comments)
         formatted_comments = []
         for comment in comment_details:
@@ -278,26 +325,30 @@ def analyze_sentiment(youtube_handler, video_url):
     with st.spinner('Analysing the sentiment of the comments....'):
         try:
             video_id = youtube_handler.extract_video_id(video_url)
-            comments = youtube_handler.get_youtube_comments(video_id)
-            comment_details = youtube_handler.extract_comment_details(comments)
-            texts = [comment['text'] for comment in comment_details]
-
             video_details = youtube_handler.get_video_details(video_id)
             video_info = youtube_handler.extract_video_details(video_details)
             like_count = int(video_info['like_count'] or 0)
             dislike_count = int(video_info['dislike_count'] or 0)
-            comment_count = int(video_info['comment_count'] or 0)
             st.sidebar.write(f"** {like_count} likes vs {dislike_count} dislikes ** ")
-            st.sidebar.write(f"**Comment number:** {comment_count}")
-
-            input_data = {"input_data": texts}
-            run_response = requests.post(f"{config['backend_url']}/run-sentimental-model", json=input_data)
-            if run_response.status_code == 200:
-                sentiment_scores = run_response.json()
-                fig2 = plot_sentiment_pie(sentiment_scores)
-                st.sidebar.pyplot(fig2, transparent=True)
-            else:
+
+            # The backend scores the comments stored at ingestion, only the ones not scored yet
+            run_response = requests.post(f"{config['backend_url']}/session-sentiment", json={"video_url": video_url})
+            if run_response.status_code != 200:
                 st.write("Error running the model: ", run_response.text)
+                return
+            sentiment = run_response.json()
+            st.sidebar.write(f"**Comment number:** {sentiment['total_comments']}")
+            if not sentiment["overall"]:
+                st.sidebar.warning("No comments stored for this video. Process it with the Chat button first.")
+                return
+            fig2 = plot_sentiment_pie(sentiment["overall"])
+            st.sidebar.pyplot(fig2, transparent=True)
+            if sentiment["per_day"]:
+                st.sidebar.write("**Sentiment per day**")
+                st.sidebar.line_chart({
+                    label: {day["day"]: day.get(label, 0.0) for day in sentiment["per_day"]}
+                    for label in ("positive", "neutral", "negative")
+                })
         except Exception as e:
             st.error(f"A mistake was made in analysing the sentiment: {str(e)}")
         
@@ -312,17 +363,38 @@ def load_chat_history():
         st.session_state.messages = [
             (message['type'], message['content']) for message in history
         ]
+        # New messages are appended locally, the history is only downloaded once per session
+        st.session_state.history_loaded_for = st.session_state.get("session_key")
     else:
         st.error(f"Error al cargar el historial del chat: {response.text}")
 
-def send_question(user_input):
-    response = requests.post(f"{config['backend_url']}/execute-graph", json={
+def stream_question(user_input):
+    # Render the answer tokens as the backend generates them
+    placeholder = st.empty()
+    placeholder.write("Esperando respuesta...")
+    answer = ""
+    with requests.post(f"{config['backend_url']}/execute-graph-stream", json={
         "video_url": st.session_state.video_url,
         "question": user_input
-    })
-    if response.status_code == 200:
-        return response.json().get("response")
-    return f"Error {response.status_code}: {response.text}"
+    }, stream=True) as response:
+        if response.status_code != 200:
+            answer = f"Error {response.status_code}: {response.text}"
+        else:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "generation_start":
+                    answer = ""
+                elif event["event"] == "token":
+                    answer += event["token"]
+                    placeholder.write(answer)
+                elif event["event"] == "final":
+                    answer = event["response"]
+                elif event["event"] == "error":
+                    answer = f"Error: {event['detail']}"
+    placeholder.write(answer)
+    return answer
 
 # Renderizar la aplicación completa
 def main():
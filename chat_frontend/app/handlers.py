@@ -1,35 +1,132 @@
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
 from datetime import timedelta
 
+# Only the fields read by extract_comment_details and extract_video_details are requested
+COMMENT_FIELDS = ("nextPageToken,items(snippet(totalReplyCount,topLevelComment(snippet("
+                  "authorDisplayName,authorProfileImageUrl,authorChannelUrl,textDisplay,"
+                  "publishedAt,updatedAt,likeCount))))")
+VIDEO_FIELDS = ("items(snippet(title,description,tags,publishedAt,channelTitle,categoryId),"
+                "contentDetails(duration),statistics(viewCount,likeCount,dislikeCount,commentCount))")
+
 class YouTubeHandler:
-    def __init__(self, api_key):
+    def __init__(self, api_key, max_comments=None, max_comment_pages=None, max_workers=3, api_endpoint=None):
+        """
+        Args:
+            api_key (str): YouTube Data API key
+            max_comments (int): stop paging comments after this many threads, None for all of them
+            max_comment_pages (int): stop paging comments after this many pages, None for all of them
+            max_workers (int): concurrent requests of fetch_video_data
+            api_endpoint (str): base URL of the Data API, e.g. a local fake for tests
+        """
         self.api_key = api_key
-        self.youtube = build('youtube', 'v3', developerKey=self.api_key)
+        self.max_comments = max_comments
+        self.max_comment_pages = max_comment_pages
+        self.max_workers = max_workers
+        self.client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        self._local = threading.local()
+        self.youtube = self._local.youtube = self._build_client()
+
+    def _build_client(self):
+        # Built from the bundled discovery document, no request is made here
+        return build('youtube', 'v3', developerKey=self.api_key, http=build_http(),
+                     client_options=self.client_options)
+
+    @property
+    def client(self):
+        """
+        API client of the current thread: httplib2 connections are not thread safe,
+        so each worker thread gets its own client and http object.
+        """
+        youtube = getattr(self._local, "youtube", None)
+        if youtube is None:
+            youtube = self._local.youtube = self._build_client()
+        return youtube
+
+    def get_youtube_comments(self, video_id, since=None):
+        """
+        Args:
+            video_id (str): YouTube video id
+            since (str): only return comment threads published at or after this ISO
+                timestamp. Threads are then requested newest first and paging stops at the
+                first older one; threads of that same second are returned again and
+                deduplicated by the backend. Without it, threads come in the API's default
+                (relevance) order.
 
-    def get_youtube_comments(self, video_id):
+        Returns:
+            list: comment thread resources
+        """
         comments = []
         next_page_token = None
+        pages = 0
 
         while True:
-            request = self.youtube.commentThreads().list(
-                part='snippet,replies',
+            max_results = 100
+            if self.max_comments is not None:
+                max_results = min(max_results, self.max_comments - len(comments))
+            request = self.client.commentThreads().list(
+                part='snippet',
                 videoId=video_id,
                 textFormat='plainText',
-                maxResults=100,
-                pageToken=next_page_token
+                maxResults=max_results,
+                pageToken=next_page_token,
+                order='time' if since else 'relevance',
+                fields=COMMENT_FIELDS
             )
             response = request.execute()
-            comments.extend(response['items'])
+            items = response.get('items', [])
+            pages += 1
+            if since:
+                new_items = [item for item in items
+                             if item['snippet']['topLevelComment']['snippet']['publishedAt'] >= since]
+                comments.extend(new_items)
+                if len(new_items) < len(items):
+                    break
+            else:
+                comments.extend(items)
 
             next_page_token = response.get('nextPageToken')
             if not next_page_token:
                 break
+            if self.max_comments is not None and len(comments) >= self.max_comments:
+                break
+            if self.max_comment_pages is not None and pages >= self.max_comment_pages:
+                break
 
         return comments
 
+    def fetch_video_data(self, video_id):
+        """
+        Fetch the transcript, the video details and the comments of a video concurrently.
+        Comment pages are still requested in order, since each needs the previous page token.
+
+        Args:
+            video_id (str): YouTube video id
+
+        Returns:
+            dict: "transcript", "details" and "comments" results, and "errors" with the
+            exception of each request that failed
+        """
+        tasks = {
+            "comments": self.get_youtube_comments,
+            "transcript": self.get_transcript,
+            "details": self.get_video_details,
+        }
+        data = {"transcript": None, "details": None, "comments": [], "errors": {}}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {name: executor.submit(task, video_id) for name, task in tasks.items()}
+            for name, future in futures.items():
+                try:
+                    data[name] = future.result()
+                except Exception as e:
+                    data["errors"][name] = e
+        return data
+
     def extract_comment_details(self, comments):
         all_comments = []
         for comment_thread in comments:
@@ -140,9 +237,10 @@ class YouTubeHandler:
             raise ValueError("No se pudo extraer la ID del video de la URL proporcionada.")
 
     def get_video_details(self, video_id):
-        request = self.youtube.videos().list(
+        request = self.client.videos().list(
             part="snippet,contentDetails,statistics",
-            id=video_id
+            id=video_id,
+            fields=VIDEO_FIELDS
         )
         response = request.execute()
         return response['items'][0]
@@ -200,7 +298,7 @@ class YouTubeHandler:
             bool: True si el video existe, False si no.
         """
         try:
-            request = self.youtube.videos().list(
+            request = self.client.videos().list(
                 part="id",
                 id=video_id
             )
@@ -0,0 +1,94 @@
+"""
+Comment paging of YouTubeHandler against a local fake of the YouTube Data API.
+
+Run from chat_frontend/:
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+
+# app.py imports its modules from the app directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+from handlers import YouTubeHandler
+
+N_COMMENTS = 250
+NEWEST = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+def published_at(index):
+    # Newest first, one second apart; comments 120 and 121 share the same second
+    seconds = index - 1 if index > 120 else index
+    return (NEWEST - timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def comment_thread(index):
+    return {"snippet": {"totalReplyCount": 0, "topLevelComment": {"snippet": {
+        "authorDisplayName": f"author {index}", "textDisplay": f"comment {index}",
+        "publishedAt": published_at(index), "likeCount": index}}}}
+
+class FakeDataApi(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, params))
+        offset = int(params.get("pageToken", 0))
+        max_results = int(params.get("maxResults", 20))
+        body = {"items": [comment_thread(i) for i in range(offset, min(offset + max_results, N_COMMENTS))]}
+        if offset + max_results < N_COMMENTS:
+            body["nextPageToken"] = str(offset + max_results)
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+@pytest.fixture(scope="module")
+def api_endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDataApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+@pytest.fixture
+def api_requests():
+    FakeDataApi.requests.clear()
+    return FakeDataApi.requests
+
+def comment_indexes(threads):
+    return [thread["snippet"]["topLevelComment"]["snippet"]["likeCount"] for thread in threads]
+
+def test_pages_through_every_comment(api_endpoint, api_requests):
+    handler = YouTubeHandler("KEY", api_endpoint=api_endpoint)
+    assert comment_indexes(handler.get_youtube_comments("video")) == list(range(N_COMMENTS))
+    assert [params.get("pageToken") for _, params in api_requests] == [None, "100", "200"]
+    assert all(path.endswith("/youtube/v3/commentThreads") for path, _ in api_requests)
+    # The first ingest keeps the API's default order
+    assert {params["order"] for _, params in api_requests} == {"relevance"}
+
+def test_max_comments_caps_the_last_page(api_endpoint, api_requests):
+    handler = YouTubeHandler("KEY", max_comments=150, api_endpoint=api_endpoint)
+    assert comment_indexes(handler.get_youtube_comments("video")) == list(range(150))
+    assert [params["maxResults"] for _, params in api_requests] == ["100", "50"]
+
+def test_max_comment_pages(api_endpoint, api_requests):
+    handler = YouTubeHandler("KEY", max_comment_pages=2, api_endpoint=api_endpoint)
+    assert len(handler.get_youtube_comments("video")) == 200
+    assert len(api_requests) == 2
+
+def test_since_stops_at_the_first_older_comment(api_endpoint, api_requests):
+    handler = YouTubeHandler("KEY", api_endpoint=api_endpoint)
+    threads = handler.get_youtube_comments("video", since=published_at(120))
+    # Comment 121 was published in the same second as the cutoff and is kept
+    assert comment_indexes(threads) == list(range(122))
+    assert len(api_requests) == 2
+    assert {params["order"] for _, params in api_requests} == {"time"}
@@ -3,22 +3,42 @@ from app.llm_chain import create_llm
 from app.prompt_templates import *
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 import json
+import time
 from app.utils import config
+from app.metrics import AGENT_SECONDS, observe_llm_call
+
+# Tag of the LLM runs whose tokens are the answer shown to the user
+ANSWER_TAG = "answer"
 
 class BaseAgent:
+    # Callback tags of the agent's LLM calls
+    tags = []
+
     def __init__(self, template, input_variables, parser):
         self.llm = create_llm() 
         self.parser = parser
         self.template= template
         self.prompt = PromptTemplate(template=template, input_variables=input_variables)
-        self.llm_chain = self.prompt | self.llm | self.parser
         
     def run_chain(self, inputs):
-        return self.llm_chain.invoke(inputs)
+        # prompt | llm | parser, run one by one to time the LLM call
+        start = time.perf_counter()
+        try:
+            prompt = self.prompt.invoke(inputs)
+            llm_start = time.perf_counter()
+            completion = self.llm.invoke(prompt, config={"tags": list(self.tags)})
+            llm_seconds = time.perf_counter() - llm_start
+            # Token counts reported by the pooled model for this call, nothing is tokenized again
+            usage = getattr(self.llm, "last_usage", None)
+            if usage:
+                observe_llm_call(type(self).__name__, usage["prompt_tokens"],
+                                 usage["completion_tokens"], llm_seconds)
+            return self.parser.invoke(completion)
+        finally:
+            AGENT_SECONDS.labels(agent=type(self).__name__).observe(time.perf_counter() - start)
 
     def set_llm(self, llm):
         self.llm = llm
-        self.llm_chain = self.prompt | self.llm | self.parser
 
 class DocAgent(BaseAgent):
     def __init__(self, template=datasource_template, 
@@ -64,7 +84,36 @@ class GraderDocsAgent(BaseAgent):
 
         return json_response["score"]
 
+class BatchGraderDocsAgent(BaseAgent):
+    def __init__(self, n_documents, template=batch_doc_grader_template, 
+                 input_variables=["question", "documents"], 
+                 parser=JsonOutputParser()):
+        super().__init__(template, input_variables, parser)
+        self.n_documents = n_documents
+        # Room for one {"score": "..."} object per document
+        self.set_llm(create_llm(grammar_path=config['grammar']['score_list_path'],
+                                max_tokens=16 * n_documents + 16))
+        
+    def grade_docs(self, input):
+        response = self.run_chain(input)
+        if isinstance(response, str):
+            try:
+                json_response = json.loads(response)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON format: {str(e)}")
+        else:
+            json_response = response
+
+        if not isinstance(json_response, list) or len(json_response) != self.n_documents:
+            raise ValueError(f"Invalid JSON format: Expected a list of {self.n_documents} scores.")
+        if any(not isinstance(item, dict) or "score" not in item for item in json_response):
+            raise ValueError("Invalid JSON format: Missing 'score' key.")
+
+        return [item["score"] for item in json_response]
+
 class GenerateAnswerAgent(BaseAgent):
+    tags = [ANSWER_TAG]
+
     def __init__(self, template=generater_template, 
                  input_variables=["question", "documents"], 
                  parser=StrOutputParser()):
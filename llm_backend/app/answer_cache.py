@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.embedding_service import get_embedding_service
+from app.utils import config
+
+class SemanticAnswerCache:
+    """
+    Accepted answers of each video session, looked up by question similarity.
+
+    Questions are embedded with the shared embedding service (normalized vectors, so
+    the dot product is the cosine similarity). A question whose similarity with a
+    cached one reaches `similarity_threshold` gets the cached answer back. Entries
+    expire after `ttl_seconds` and both entries and sessions are evicted LRU.
+    """
+    def __init__(self, enabled=True, similarity_threshold=0.95, ttl_seconds=86400,
+                 max_entries_per_session=256, max_sessions=128):
+        self.enabled = enabled
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_session = max_entries_per_session
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed(self, question):
+        return np.asarray(get_embedding_service().embed_query(question.strip()), dtype=np.float32)
+
+    def get(self, session_id, embedding):
+        """
+        Returns:
+            str: cached answer of the most similar question, None on a miss
+        """
+        with self._lock:
+            entries = self._sessions.get(session_id)
+            if not entries:
+                return None
+            self._sessions.move_to_end(session_id)
+
+            now = time.time()
+            for question in [q for q, entry in entries.items() if now - entry[2] > self.ttl_seconds]:
+                del entries[question]
+            if not entries:
+                # Drop the emptied session too, it would otherwise outlive the LRU bound
+                del self._sessions[session_id]
+                return None
+
+            questions = list(entries.keys())
+            similarities = np.stack([entries[q][0] for q in questions]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            entries.move_to_end(questions[best])
+            print(f"Answer cache hit for session {session_id} (similarity {similarities[best]:.3f}): {questions[best]}")
+            return entries[questions[best]][1]
+
+    def put(self, session_id, question, embedding, answer):
+        with self._lock:
+            entries = self._sessions.setdefault(session_id, OrderedDict())
+            self._sessions.move_to_end(session_id)
+            entries[question] = (embedding, answer, time.time())
+            entries.move_to_end(question)
+            while len(entries) > self.max_entries_per_session:
+                entries.popitem(last=False)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+answer_cache = SemanticAnswerCache(**config['answer_cache'])
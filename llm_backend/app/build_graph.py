@@ -1,12 +1,14 @@
 from langgraph.graph import END, StateGraph, START
 from app.graph_state import *
+from app.metrics import timed_node
 
 workflow = StateGraph(GraphState)
 
-workflow.add_node("search_docs", search_docs)  
-workflow.add_node("generate", generate)  
-workflow.add_node("grade_documents", grade_documents) 
-workflow.add_node("transform_query", transform_query)  
+workflow.add_node("search_docs", timed_node("search_docs", search_docs))  
+workflow.add_node("generate", timed_node("generate", generate))  
+workflow.add_node("grade_documents", timed_node("grade_documents", grade_documents)) 
+workflow.add_node("transform_query", timed_node("transform_query", transform_query))  
+workflow.add_node("finish_on_budget", finish_on_budget)  
 
 workflow.add_edge(START, "search_docs")
 workflow.add_edge("search_docs", "grade_documents")
@@ -17,6 +19,7 @@ workflow.add_conditional_edges(
     {
         "transform_query": "transform_query",
         "generate": "generate",
+        "budget exhausted": "finish_on_budget",
     },
 )
 
@@ -24,12 +27,16 @@ workflow.add_edge("transform_query", "search_docs")
 
 workflow.add_conditional_edges(
     "generate",
-    grade_generation_v_documents_and_question,
+    # The generation and answer graders run in this edge
+    timed_node("grade_generation", grade_generation_v_documents_and_question),
     {
         "not supported": "generate",  
         "useful": END, 
         "not useful": "transform_query", 
+        "budget exhausted": "finish_on_budget",
     },
 )
 
+workflow.add_edge("finish_on_budget", END)
+
 graph_app = workflow.compile()
@@ -0,0 +1,78 @@
+from functools import lru_cache
+from typing import List, NamedTuple
+from langchain.schema.document import Document
+from langchain_core.messages import get_buffer_string
+from transformers import AutoTokenizer
+from app.utils import config
+
+DOCUMENT_SEPARATOR = "\n\n"
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_name):
+    # Loaded once per process, only used when no llama model is available
+    return AutoTokenizer.from_pretrained(model_name)
+
+class PackedContext(NamedTuple):
+    history: str
+    documents: List[Document]
+    documents_text: str
+    total_tokens: int
+
+class ContextPacker:
+    """
+    Fits the chat history and the retrieved documents into the model context window.
+
+    The prompt budget is `n_ctx - max_tokens` so the answer always has room to be
+    generated. Every piece of text is tokenized once: the template and the question
+    are mandatory, then documents are added in rank order and finally the most
+    recent history messages fill whatever budget is left.
+    """
+    def __init__(self, llm=None, n_ctx=None, max_tokens=None):
+        self.llm = llm
+        self.n_ctx = n_ctx or (llm.n_ctx if llm is not None else config['llama-param']['n_ctx'])
+        self.max_tokens = max_tokens or (llm.max_tokens if llm is not None else 256)
+
+    @property
+    def budget(self):
+        return self.n_ctx - self.max_tokens
+
+    def count_tokens(self, text):
+        if self.llm is not None and self.llm.client is not None:
+            # Reuse the tokenizer of the resident llama.cpp model
+            return len(self.llm.client.tokenize(text.encode("utf-8"), add_bos=False))
+        tokenizer = get_tokenizer(config['context_packer']['tokenizer'])
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def pack(self, template, question, history=[], documents=[]):
+        # +1 for the BOS token added once to the whole prompt
+        used = 1 + self.count_tokens(template) + self.count_tokens(question)
+        if used > self.budget:
+            raise ValueError(f"The prompt ({used} tokens) does not fit in the context window "
+                             f"({self.n_ctx} tokens with {self.max_tokens} reserved for the answer).")
+
+        separator_tokens = self.count_tokens(DOCUMENT_SEPARATOR)
+        packed_documents = []
+        for document in documents:
+            tokens = self.count_tokens(document.page_content) + separator_tokens
+            if used + tokens <= self.budget:
+                packed_documents.append(document)
+                used += tokens
+
+        packed_history = []
+        for message in reversed(history):
+            tokens = self.count_tokens(get_buffer_string([message])) + 1
+            if used + tokens > self.budget:
+                break
+            packed_history.insert(0, message)
+            used += tokens
+
+        if len(packed_documents) < len(documents) or len(packed_history) < len(history):
+            print(f"Context packed to {used}/{self.budget} tokens: {len(packed_documents)}/{len(documents)} documents, "
+                  f"{len(packed_history)}/{len(history)} history messages.")
+
+        return PackedContext(
+            history=get_buffer_string(packed_history),
+            documents=packed_documents,
+            documents_text=DOCUMENT_SEPARATOR.join(document.page_content for document in packed_documents),
+            total_tokens=used
+        )
@@ -29,6 +29,17 @@ class ModelType(str, Enum):
 class QueryModel(BaseModel):
     video_url: str
     question: str    
+    # Optional overrides of config['graph_budget']
+    max_generate_attempts: Optional[int] = None
+    max_query_rewrites: Optional[int] = None
+    max_seconds: Optional[float] = None
+
+    def budget_overrides(self):
+        return {
+            "max_generate_attempts": self.max_generate_attempts,
+            "max_query_rewrites": self.max_query_rewrites,
+            "max_seconds": self.max_seconds,
+        }
  
 class VideoSessionModel(BaseModel):
     video_url:str
@@ -65,4 +76,11 @@ class DownloadModelRequest(BaseModel):
         protected_namespaces = ()
 
 class RunSentimentalModel(BaseModel):
-    input_data: list[str]
\ No newline at end of file
+    input_data: list[str]
+
+class SessionSentimentRequest(BaseModel):
+    video_url: str
+
+class RefreshSessionModel(BaseModel):
+    video_url: str
+    comments: List[Dict[str, Union[str, int]]]
\ No newline at end of file
@@ -1,150 +1,393 @@
 import sqlite3
+import hashlib
+import chromadb
 import os
+import threading
+import time
+from itertools import islice
+from sqlalchemy import create_engine, event
 from langchain_community.chat_message_histories import SQLChatMessageHistory
+from langchain_community.chat_message_histories.sql import DefaultMessageConverter
 from app.utils import config
 from fastapi import HTTPException
 
-class ChatSessionManager:
-    def __init__(self, session_id):
-        self.session_id = session_id
-        self.connection_string = config['chat_sessions_database_string']
-        self._initialize_db()
-        self.message_history = SQLChatMessageHistory(session_id=session_id, connection_string=self.connection_string)
+# Applied to every connection, WAL lets readers run while a writer commits
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_initialized = False
+_engine = None
+_message_converter = DefaultMessageConverter("message_store")
+
+def apply_pragmas(conn):
+    cursor = conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def get_connection():
+    """
+    Return the SQLite connection of the current thread, opening it on first use.
 
-    def _initialize_db(self):
-        db_path = config["chat_sessions_database_path"]
-        db_dir = os.path.dirname(db_path)
+    Connections are kept open for the lifetime of the thread, so the worker and
+    FastAPI threadpool threads reuse theirs across requests.
+    """
+    conn = getattr(_local, "connection", None)
+    if conn is None:
+        conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
+        apply_pragmas(conn)
+        _local.connection = conn
+    return conn
+
+def get_engine():
+    """Return the SQLAlchemy engine shared by every chat message history"""
+    global _engine
+    with _schema_lock:
+        if _engine is None:
+            _engine = create_engine(config['chat_sessions_database_string'])
+            event.listen(_engine, "connect", lambda dbapi_connection, _: apply_pragmas(dbapi_connection))
+        return _engine
+
+def initialize_database():
+    """Create the database file and its tables once per process"""
+    global _schema_initialized
+    with _schema_lock:
+        if _schema_initialized:
+            return
+        db_dir = os.path.dirname(config["chat_sessions_database_path"])
         
         # Crear el directorio si no existe
         if not os.path.exists(db_dir):
             os.makedirs(db_dir)
         
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        self._create_tables(conn)  
-        conn.close()  
+        apply_migrations(get_connection())
+        _schema_initialized = True
 
-    def _create_tables(self, conn):
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_key TEXT,
-                sender_type TEXT,
-                content TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transcript (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_key TEXT,
-                content TEXT
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS comments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_key TEXT,
-                author TEXT,
-                content TEXT,
-                published_at DATETIME,
-                like_count INTEGER
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS video_details (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_key TEXT UNIQUE,
-                video_title TEXT,
-                video_url TEXT UNIQUE,
-                channel_title TEXT,
-                description TEXT,
-                publish_date TEXT,
-                duration TEXT
-            )
-        """)
-        
-        conn.commit()
+def get_collection_name(session_id):
+    """Chroma collection holding the embedded chunks of a session"""
+    return f"rag-chroma-{session_id}"
+
+def text_hash(text):
+    """Key of a comment text in the per-text caches (sentiment scores)"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def backfill_comment_hashes(conn):
+    rows = conn.execute("SELECT id, content FROM comments WHERE content_hash IS NULL").fetchall()
+    for batch in iter_batches(rows, config['comments_ingest_batch_size']):
+        conn.executemany("UPDATE comments SET content_hash = ? WHERE id = ?",
+                         [(text_hash(content), comment_id) for comment_id, content in batch])
+
+# Each entry upgrades the schema by one version. The version of a database file is
+# stored in `PRAGMA user_version`, so existing databases are upgraded in place.
+# A step is either a SQL statement or a function receiving the connection.
+MIGRATIONS = [
+    # 1: base tables
+    [
+        """
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_key TEXT,
+            sender_type TEXT,
+            content TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transcript (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_key TEXT,
+            content TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_key TEXT,
+            author TEXT,
+            content TEXT,
+            published_at DATETIME,
+            like_count INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS video_details (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_key TEXT UNIQUE,
+            video_title TEXT,
+            video_url TEXT UNIQUE,
+            channel_title TEXT,
+            description TEXT,
+            publish_date TEXT,
+            duration TEXT
+        )
+        """,
+    ],
+    # 2: session lookups without full table scans
+    [
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_key, id)",
+        "CREATE INDEX IF NOT EXISTS idx_transcript_session ON transcript (session_key, id)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_session ON comments (session_key, published_at)",
+        # Same schema SQLChatMessageHistory creates for its table
+        """
+        CREATE TABLE IF NOT EXISTS message_store (
+            id INTEGER NOT NULL PRIMARY KEY,
+            session_id TEXT,
+            message TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_message_store_session ON message_store (session_id, id)",
+    ],
+    # 3: per-comment sentiment, cached by text hash and model
+    [
+        "ALTER TABLE comments ADD COLUMN content_hash TEXT",
+        backfill_comment_hashes,
+        """
+        CREATE TABLE IF NOT EXISTS comment_sentiment (
+            text_hash TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            label TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (text_hash, model_name, label)
+        ) WITHOUT ROWID
+        """,
+    ],
+    # 4: lexical (BM25) index of the transcript and comment chunks, filled at ingest.
+    # Chunks live in an indexed table and chunks_fts is its external-content index;
+    # session_key is an indexed FTS column so MATCH only walks the session's postings
+    [
+        """
+        CREATE TABLE IF NOT EXISTS lexical_chunks (
+            id INTEGER PRIMARY KEY,
+            session_key TEXT NOT NULL,
+            source TEXT,
+            content TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_lexical_chunks_session ON lexical_chunks(session_key, source)",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+            content,
+            session_key,
+            source UNINDEXED,
+            content = 'lexical_chunks',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS lexical_chunks_ai AFTER INSERT ON lexical_chunks BEGIN
+            INSERT INTO chunks_fts (rowid, content, session_key, source)
+            VALUES (new.id, new.content, new.session_key, new.source);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS lexical_chunks_ad AFTER DELETE ON lexical_chunks BEGIN
+            INSERT INTO chunks_fts (chunks_fts, rowid, content, session_key, source)
+            VALUES ('delete', old.id, old.content, old.session_key, old.source);
+        END
+        """,
+    ],
+]
+
+def iter_batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn, target_version=None):
+    """
+    Upgrade the database schema one version at a time.
+
+    Args:
+        conn (sqlite3.Connection): database connection
+        target_version (int): stop at this version, defaults to the latest one
+
+    Returns:
+        int: schema version of the database
+    """
+    target_version = len(MIGRATIONS) if target_version is None else target_version
+    for version in range(get_schema_version(conn) + 1, target_version + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in MIGRATIONS[version - 1]:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Database schema migrated to version {version}.")
+    return get_schema_version(conn)
+
+class ChatSessionManager:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        initialize_database()
+        self.message_history = SQLChatMessageHistory(session_id=session_id,
+                                                     connection=get_engine(),
+                                                     custom_message_converter=_message_converter)
 
     def table_exists(self, table_name):
-        conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
         table_exists = cursor.fetchone() is not None
         
-        conn.close()
         return table_exists
 
     def add_video_session(self, video_title, video_url, channel_title, description, publish_date, duration, replace_existing=False):
-        conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-        cursor = conn.cursor()
+        conn = get_connection()
+        with conn:
+            cursor = conn.cursor()
 
-        cursor.execute("SELECT * FROM video_details WHERE video_url = ?", (video_url,))
-        existing_video = cursor.fetchone()
+            cursor.execute("SELECT 1 FROM video_details WHERE video_url = ?", (video_url,))
+            existing_video = cursor.fetchone()
 
-        if existing_video:
-            if replace_existing:
-                cursor.execute("""
-                    UPDATE video_details 
-                    SET video_title = ?, channel_title = ?, description = ?, publish_date = ?, duration = ? 
-                    WHERE video_url = ?
-                """, (video_title, channel_title, description, publish_date, duration, video_url))
-                print(f"Existing video updated for session {self.session_id}.")
-            else:
-                conn.close()
-                return None
+            if existing_video:
+                if replace_existing:
+                    cursor.execute("""
+                        UPDATE video_details 
+                        SET video_title = ?, channel_title = ?, description = ?, publish_date = ?, duration = ? 
+                        WHERE video_url = ?
+                    """, (video_title, channel_title, description, publish_date, duration, video_url))
+                    print(f"Existing video updated for session {self.session_id}.")
+                else:
+                    return None
 
-        else:
-            cursor.execute("""
-                INSERT INTO video_details (session_key, video_title, video_url, channel_title, description, publish_date, duration) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)""", 
-                (self.session_id, video_title, video_url, channel_title, description, publish_date, duration)
-            )
-            print(f"New video session created for session {self.session_id}.")
+            else:
+                cursor.execute("""
+                    INSERT INTO video_details (session_key, video_title, video_url, channel_title, description, publish_date, duration) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""", 
+                    (self.session_id, video_title, video_url, channel_title, description, publish_date, duration)
+                )
+                print(f"New video session created for session {self.session_id}.")
 
-        conn.commit()
-        conn.close()
+    def has_documents(self):
+        cursor = get_connection().cursor()
+        cursor.execute("""
+            SELECT EXISTS(SELECT 1 FROM transcript WHERE session_key = ?)
+                OR EXISTS(SELECT 1 FROM comments WHERE session_key = ?)
+        """, (self.session_id, self.session_id))
+        return bool(cursor.fetchone()[0])
 
     def add_documents_to_db(self, transcript=None, comments=[], replace_existing=False):
-        conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-        cursor = conn.cursor()
+        """
+        Store the transcript and comments of the session.
 
-        cursor.execute("SELECT * FROM transcript WHERE session_key = ?", (self.session_id,))
-        existing_transcript = cursor.fetchone()
-        
-        cursor.execute("SELECT * FROM comments WHERE session_key = ?", (self.session_id,))
-        existing_comments = cursor.fetchone()
+        Comments are inserted with executemany in batches of `comments_ingest_batch_size`
+        rows, each batch in its own transaction. When replacing, the delete and every
+        insert run in a single transaction so readers never see a half-replaced session.
 
-        if existing_transcript or existing_comments:
-            if not replace_existing:
-                print(f"Documents already exist for session {self.session_id} and replace_existing is False. No changes made.")
-                conn.close()
-                return None
+        Returns:
+            bool: True if the documents were written
+        """
+        if not replace_existing and self.has_documents():
+            print(f"Documents already exist for session {self.session_id} and replace_existing is False. No changes made.")
+            return False
+
+        start = time.perf_counter()
+        batch_size = config['comments_ingest_batch_size']
+        comment_rows = (
+            (self.session_id, comment['author'], comment['text'], comment['published_at'], comment['like_count'],
+             text_hash(comment['text']))
+            for comment in comments
+        )
+        insert_comments = ("INSERT INTO comments (session_key, author, content, published_at, like_count, content_hash) "
+                           "VALUES (?, ?, ?, ?, ?, ?)")
+        conn = get_connection()
 
         if replace_existing:
-            cursor.execute("DELETE FROM transcript WHERE session_key = ?", (self.session_id,))
-            cursor.execute("DELETE FROM comments WHERE session_key = ?", (self.session_id,))
-            conn.commit()
-            print(f"Existing documents deleted for session {self.session_id}. Replacing with new documents.")
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM transcript WHERE session_key = ?", (self.session_id,))
+                cursor.execute("DELETE FROM comments WHERE session_key = ?", (self.session_id,))
+                print(f"Existing documents deleted for session {self.session_id}. Replacing with new documents.")
+                if transcript:
+                    cursor.execute("INSERT INTO transcript (session_key, content) VALUES (?, ?)", (self.session_id, transcript))
+                for batch in iter_batches(comment_rows, batch_size):
+                    cursor.executemany(insert_comments, batch)
+        else:
+            if transcript:
+                with conn:
+                    conn.execute("INSERT INTO transcript (session_key, content) VALUES (?, ?)", (self.session_id, transcript))
+            for batch in iter_batches(comment_rows, batch_size):
+                with conn:
+                    conn.executemany(insert_comments, batch)
+
+        elapsed = time.perf_counter() - start
+        print(f"Transcript and {len(comments)} comments added to db for session {self.session_id} "
+              f"in {elapsed:.2f}s ({len(comments) / elapsed:.0f} rows/s).")
+        return True
+      
+    def get_latest_comment_time(self):
+        """
+        Returns:
+            str: most recent published_at of the stored comments, None without comments
+        """
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT MAX(published_at) FROM comments WHERE session_key = ?", (self.session_id,))
+        return cursor.fetchone()[0]
+
+    def append_comments(self, comments):
+        """
+        Append the comments published since the latest stored one, in a single transaction.
 
-        if transcript:
-            cursor.execute("INSERT INTO transcript (session_key, content) VALUES (?, ?)", (self.session_id, transcript))
+        published_at has a one second resolution: comments of that same second are kept
+        unless the same (author, published_at, text) is already stored.
 
-        for comment in comments:
-            cursor.execute(
-                "INSERT INTO comments (session_key, author, content, published_at, like_count) VALUES (?, ?, ?, ?, ?)",
-                (self.session_id, comment['author'], comment['text'], comment['published_at'], comment['like_count'])
+        Args:
+            comments (list[dict]): comments with author, text, published_at and like_count
+
+        Returns:
+            list[dict]: comments actually inserted
+        """
+        conn = get_connection()
+        with conn:
+            latest = conn.execute("SELECT MAX(published_at) FROM comments WHERE session_key = ?",
+                                  (self.session_id,)).fetchone()[0]
+            seen = set()
+            if latest is not None:
+                seen = set(conn.execute(
+                    "SELECT author, published_at, content_hash FROM comments "
+                    "WHERE session_key = ? AND published_at = ?", (self.session_id, latest)).fetchall())
+            new_comments = []
+            for comment in comments:
+                if latest is not None and comment['published_at'] < latest:
+                    continue
+                key = (comment['author'], comment['published_at'], text_hash(comment['text']))
+                if key in seen:
+                    continue
+                seen.add(key)
+                new_comments.append(comment)
+            conn.executemany(
+                "INSERT INTO comments (session_key, author, content, published_at, like_count, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.session_id, comment['author'], comment['text'], comment['published_at'],
+                  comment['like_count'], text_hash(comment['text'])) for comment in new_comments]
             )
+        print(f"{len(new_comments)} new comments appended for session {self.session_id}.")
+        return new_comments
 
-        conn.commit()
-        conn.close()
-        print(f"Transcript and comments added to db for session {self.session_id}.")
-      
     def add_user_message(self, message):
         self.message_history.add_user_message(message)
 
@@ -153,21 +396,12 @@ class ChatSessionManager:
 
     def get_video_details(self):
         try:
-            conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='video_details';")
-            table_exists = cursor.fetchone()
-
-            if not table_exists:
-                return ""
-
+            cursor = get_connection().cursor()
             cursor.execute("SELECT video_title, channel_title, description, publish_date, duration FROM video_details WHERE session_key = ?", (self.session_id,))
             video_details = cursor.fetchone()
 
             if not video_details:
                 return ""
-            conn.close()
 
             return {
                 "video_title": video_details[0],
@@ -187,11 +421,9 @@ class ChatSessionManager:
 
     def get_transcript_from_db(self):
         try:
-            conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-            cursor = conn.cursor()
+            cursor = get_connection().cursor()
             cursor.execute("SELECT content FROM transcript WHERE session_key = ?", (self.session_id,))
             transcript = cursor.fetchone()
-            conn.close()
             print(transcript)
             if transcript:
                 return transcript[0]
@@ -203,11 +435,9 @@ class ChatSessionManager:
         
     def get_comments_from_db(self):
         try:
-            conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-            cursor = conn.cursor()
+            cursor = get_connection().cursor()
             cursor.execute("SELECT author, content, published_at, like_count FROM comments WHERE session_key = ?", (self.session_id,))
             comments = cursor.fetchall()
-            conn.close()
             print(comments)
             if comments:
                 return [{"author": row[0], "text": row[1], "published_at": row[2], "like_count": row[3]} for row in comments]
@@ -216,31 +446,166 @@ class ChatSessionManager:
         except Exception as e:
             raise ValueError(f"Error getting comments: {str(e)}.")
         
+    def has_lexical_chunks(self):
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM lexical_chunks WHERE session_key = ?)", (self.session_id,))
+        return bool(cursor.fetchone()[0])
+
+    def add_lexical_chunks(self, chunks, replace_existing=False):
+        """
+        Add chunks to the FTS5 index of the session
+
+        Args:
+            chunks (list[tuple]): (content, source) pairs
+            replace_existing (bool): drop the chunks already indexed for the session
+        """
+        conn = get_connection()
+        with conn:
+            if replace_existing:
+                conn.execute("DELETE FROM lexical_chunks WHERE session_key = ?", (self.session_id,))
+            # The triggers of lexical_chunks keep chunks_fts in sync
+            conn.executemany("INSERT INTO lexical_chunks (content, session_key, source) VALUES (?, ?, ?)",
+                             [(content, self.session_id, source) for content, source in chunks])
+
+    def search_lexical(self, match_query, source=None, limit=20):
+        """
+        BM25 search over the session chunks
+
+        Args:
+            match_query (str): FTS5 MATCH expression, already sanitized
+            source (str): "transcript" or "comments" to restrict the search, None for both
+            limit (int): maximum number of chunks
+
+        Returns:
+            list[tuple]: (content, source) pairs, best match first
+        """
+        # The session_key column filter intersects the question terms with the session's
+        # postings instead of matching every video; the join drops any token-level collision
+        session_phrase = self.session_id.replace('"', '""')
+        query = ("SELECT c.content, c.source FROM chunks_fts JOIN lexical_chunks c ON c.id = chunks_fts.rowid "
+                 "WHERE chunks_fts MATCH ? AND c.session_key = ?")
+        params = [f'session_key : "{session_phrase}" AND content : ({match_query})', self.session_id]
+        if source is not None:
+            query += " AND c.source = ?"
+            params.append(source)
+        # Zero weight on session_key: only the content column ranks the chunks
+        query += " ORDER BY bm25(chunks_fts, 1.0, 0.0) LIMIT ?"
+        params.append(limit)
+        return get_connection().execute(query, params).fetchall()
+
+    def get_unscored_comments(self, model_name):
+        """
+        Distinct comment texts of the session without a stored score for `model_name`
+
+        Returns:
+            list[tuple]: (text_hash, text) pairs
+        """
+        cursor = get_connection().cursor()
+        cursor.execute("""
+            SELECT DISTINCT c.content_hash, c.content
+            FROM comments c
+            WHERE c.session_key = ?
+              AND NOT EXISTS (SELECT 1 FROM comment_sentiment s
+                              WHERE s.text_hash = c.content_hash AND s.model_name = ?)
+        """, (self.session_id, model_name))
+        return cursor.fetchall()
+
+    def save_comment_sentiment(self, model_name, text_hashes, scores):
+        """
+        Store the label probabilities of each comment text
+
+        Args:
+            model_name (str): sentiment model that produced the scores
+            text_hashes (list[str]): text_hash of each scored text
+            scores (list[dict]): label probabilities of each text, same order
+        """
+        rows = ((text_hash, model_name, label, score)
+                for text_hash, text_scores in zip(text_hashes, scores)
+                for label, score in text_scores.items())
+        conn = get_connection()
+        with conn:
+            for batch in iter_batches(rows, config['comments_ingest_batch_size']):
+                conn.executemany("""
+                    INSERT OR REPLACE INTO comment_sentiment (text_hash, model_name, label, score)
+                    VALUES (?, ?, ?, ?)
+                """, batch)
+
+    def get_sentiment_rollups(self, model_name):
+        """
+        Sentiment of the session comments aggregated in SQL
+
+        Returns:
+            dict: average label probabilities overall ("overall") and weighted by
+            like_count + 1 ("like_weighted"), per publication day ("per_day"), and the
+            number of comments and of scored comments
+        """
+        cursor = get_connection().cursor()
+        scored_comments = """
+            FROM comments c
+            JOIN comment_sentiment s ON s.text_hash = c.content_hash AND s.model_name = ?
+            WHERE c.session_key = ?
+        """
+        params = (model_name, self.session_id)
+        cursor.execute(f"""
+            SELECT s.label, AVG(s.score),
+                   SUM(s.score * (COALESCE(c.like_count, 0) + 1)) / SUM(COALESCE(c.like_count, 0) + 1)
+            {scored_comments}
+            GROUP BY s.label
+        """, params)
+        overall, like_weighted = {}, {}
+        for label, average, weighted in cursor.fetchall():
+            overall[label] = average
+            like_weighted[label] = weighted
+
+        cursor.execute(f"""
+            SELECT substr(c.published_at, 1, 10) AS day, s.label, AVG(s.score), COUNT(*)
+            {scored_comments}
+            GROUP BY day, s.label
+            ORDER BY day
+        """, params)
+        per_day = {}
+        for day, label, average, count in cursor.fetchall():
+            day_scores = per_day.setdefault(day, {"day": day, "comments": count})
+            day_scores[label] = average
+
+        cursor.execute(f"SELECT COUNT(DISTINCT c.id) {scored_comments}", params)
+        scored = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM comments WHERE session_key = ?", (self.session_id,))
+        total = cursor.fetchone()[0]
+        return {
+            "overall": overall,
+            "like_weighted": like_weighted,
+            "per_day": list(per_day.values()),
+            "scored_comments": scored,
+            "total_comments": total,
+        }
+
     def save_message_to_db(self, sender_type, content):
-        conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO chat_history (session_key, sender_type, content) VALUES (?, ?, ?)",
-                       (self.session_id, sender_type, content))
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with conn:
+            conn.execute("INSERT INTO chat_history (session_key, sender_type, content) VALUES (?, ?, ?)",
+                         (self.session_id, sender_type, content))
 
     def load_messages_from_db(self):
-        conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute("SELECT sender_type, content FROM chat_history WHERE session_key = ? ORDER BY id", (self.session_id,))
         messages = cursor.fetchall()
-        conn.close()
         return messages
     
     def delete_video_session(self):
-        conn = sqlite3.connect(config['chat_sessions_database_path'], check_same_thread=False)
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM chat_history WHERE session_key = ?", (self.session_id,))
-        cursor.execute("DELETE FROM transcript WHERE session_key = ?", (self.session_id),)
-        cursor.execute("DELETE FROM comments WHERE session_key = ?", (self.session_id),)
-        cursor.execute("DELETE FROM video_details WHERE session_key = ?", (self.session_id),)
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM chat_history WHERE session_key = ?", (self.session_id,))
+            cursor.execute("DELETE FROM transcript WHERE session_key = ?", (self.session_id,))
+            cursor.execute("DELETE FROM comments WHERE session_key = ?", (self.session_id,))
+            cursor.execute("DELETE FROM video_details WHERE session_key = ?", (self.session_id,))
+            cursor.execute("DELETE FROM lexical_chunks WHERE session_key = ?", (self.session_id,))
+        # A collection left behind would be taken as already built by the next ingest
+        try:
+            chromadb.PersistentClient(config["chromadb"]["chromadb_path"]).delete_collection(
+                get_collection_name(self.session_id))
+        except ValueError:
+            # The session was never embedded (lexical retrieval mode)
+            pass
         
-
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from app.database import apply_pragmas
+from app.metrics import EMBEDDING_CACHE_LOOKUPS, EMBEDDING_CACHE_BYTES
+
+# SQLite caps the number of host parameters per statement, look keys up in slices
+LOOKUP_BATCH_SIZE = 500
+
+class EmbeddingCache:
+    """
+    On-disk embeddings keyed by (model, normalization, sha256 of the text).
+
+    Vectors are stored as float32 blobs in their own SQLite file, so re-ingesting a
+    video, or reaching the same transcript through another URL, reads its chunks back
+    instead of running the model. When the vectors exceed `max_bytes`, the least
+    recently used ones are evicted down to `evict_to` of the budget.
+    """
+    def __init__(self, path, max_bytes, evict_to=0.9):
+        db_dir = os.path.dirname(path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_to = evict_to
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        apply_pragmas(self._conn)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                normalized INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, normalized, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self.size_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        EMBEDDING_CACHE_BYTES.set(self.size_bytes)
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate,
+                "size_bytes": self.size_bytes, "max_bytes": self.max_bytes}
+
+    def get_many(self, model, normalized, hashes):
+        """
+        Returns:
+            dict: text hash -> embedding (list of floats) for the hashes found in the cache
+        """
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique_hashes), LOOKUP_BATCH_SIZE):
+                batch = unique_hashes[i:i + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND normalized = ? AND text_hash IN ({placeholders})",
+                    (model, int(normalized), *batch)).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND normalized = ? AND text_hash = ?",
+                    [(now, model, int(normalized), key) for key in found])
+                self._conn.commit()
+            hits = sum(key in found for key in hashes)
+            self.hits += hits
+            self.misses += len(hashes) - hits
+        EMBEDDING_CACHE_LOOKUPS.labels(result="hit").inc(hits)
+        EMBEDDING_CACHE_LOOKUPS.labels(result="miss").inc(len(hashes) - hits)
+        return found
+
+    def put_many(self, model, normalized, entries):
+        """
+        Store (text hash, embedding) pairs and evict the least recently used vectors
+        if the cache went over its size budget.
+        """
+        now = time.time()
+        rows = [(model, int(normalized), key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for key, vector in entries]
+        if not rows:
+            return
+        with self._lock:
+            # Concurrent sessions may embed the same new text: only count rows actually added
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, normalized, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+            if self._conn.total_changes - before == len(rows):
+                self.size_bytes += sum(len(row[3]) for row in rows)
+            else:
+                self.size_bytes = self._conn.execute(
+                    "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+            if self.size_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+        EMBEDDING_CACHE_BYTES.set(self.size_bytes)
+
+    def _evict(self):
+        target = self.max_bytes * self.evict_to
+        evicted = 0
+        while self.size_bytes > target:
+            rows = self._conn.execute(
+                "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 256").fetchall()
+            if not rows:
+                break
+            freed = 0
+            stale = []
+            for rowid, size in rows:
+                stale.append((rowid,))
+                freed += size
+                if self.size_bytes - freed <= target:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", stale)
+            self.size_bytes -= freed
+            evicted += len(stale)
+        print(f"Embedding cache evicted {evicted} vectors, {self.size_bytes / 2**20:.1f} MB left")
@@ -0,0 +1,169 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+from app.utils import config, get_torch_device
+from app.metrics import observe_model_load
+from app.embedding_cache import EmbeddingCache
+
+# Queue priorities: single-slice requests (questions, answer cache, router) before ingest slices
+INTERACTIVE, BULK = 0, 1
+
+class EmbeddingService(Embeddings):
+    """
+    Process-wide embedding model shared by every session.
+
+    Embed requests are split into slices of `batch_size` texts and queued. A single
+    worker thread merges the slices queued by concurrent sessions into one forward
+    pass, waiting at most `max_wait_ms` for a batch to fill up. Requests that fit in
+    one slice are served before the slices of larger ones, so a question waits for at
+    most one ingest batch instead of the whole ingest. With a `cache`, only
+    the texts it has not seen with this model and normalization reach the queue.
+    """
+    def __init__(self, model_name, device="cpu", batch_size=32, max_seq_length=512,
+                 normalize_embeddings=True, max_wait_ms=10, cache=None):
+        start = time.perf_counter()
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+        self.model.max_seq_length = max_seq_length
+        self.batch_size = batch_size
+        self.normalize_embeddings = normalize_embeddings
+        self.max_wait_ms = max_wait_ms
+        self.cache = cache
+        # Texts longer than max_seq_length are truncated, so it is part of the cache key
+        self.cache_model_key = f"{model_name}@{max_seq_length}"
+        self.total_chunks = 0
+        self.total_seconds = 0.0
+        self._requests = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._worker = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+        self._worker.start()
+        load_seconds = time.perf_counter() - start
+        observe_model_load("embedding", model_name, load_seconds)
+        print(f"Embedding model {model_name} loaded on {device} in {load_seconds:.2f}s")
+
+    @property
+    def throughput(self):
+        """Average chunks/s since the service started"""
+        return self.total_chunks / self.total_seconds if self.total_seconds else 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        embeddings, n_cached = self._embed(list(texts))
+        if len(texts) > 1:
+            elapsed = time.perf_counter() - start
+            print(f"Embedded {len(texts)} chunks ({n_cached} from cache) in {elapsed:.2f}s "
+                  f"({len(texts) / elapsed:.1f} chunks/s)")
+            if self.cache is not None:
+                print(f"Embedding cache hit rate {self.cache.hit_rate:.1%}, {self.cache.size_bytes / 2**20:.1f} MB")
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0][0]
+
+    def _embed(self, texts):
+        """
+        Returns:
+            tuple: embeddings in input order and how many of them came from the cache
+        """
+        if self.cache is None:
+            return self._encode(texts), 0
+        hashes = [EmbeddingCache.text_hash(text) for text in texts]
+        embeddings = self.cache.get_many(self.cache_model_key, self.normalize_embeddings, hashes)
+        n_cached = sum(key in embeddings for key in hashes)
+        # Repeated texts (same comment posted twice) are encoded once
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in embeddings:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = dict(zip(missing, self._encode(list(missing.values()))))
+            self.cache.put_many(self.cache_model_key, self.normalize_embeddings, encoded.items())
+            embeddings.update(encoded)
+        return [embeddings[key] for key in hashes], n_cached
+
+    def _encode(self, texts):
+        futures = []
+        priority = INTERACTIVE if len(texts) <= self.batch_size else BULK
+        for i in range(0, len(texts), self.batch_size):
+            future = Future()
+            # The sequence number keeps slices of the same priority in FIFO order
+            self._requests.put((priority, next(self._sequence), texts[i:i + self.batch_size], future))
+            futures.append(future)
+
+        embeddings = []
+        for future in futures:
+            embeddings.extend(future.result())
+        return embeddings
+
+    def _run(self):
+        while True:
+            priority, _, request_texts, future = self._requests.get()
+            pending = [(request_texts, future)]
+            n_texts = len(request_texts)
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            # Micro-batch: keep collecting slices until the batch is full or the wait expires
+            while n_texts < self.batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request[0] != priority:
+                    # Questions are neither held behind nor batched with ingest slices
+                    self._requests.put(request)
+                    break
+                pending.append(request[2:])
+                n_texts += len(request[2])
+
+            texts = [text for request_texts, _ in pending for text in request_texts]
+            try:
+                start = time.perf_counter()
+                vectors = self.model.encode(
+                    texts,
+                    batch_size=self.batch_size,
+                    normalize_embeddings=self.normalize_embeddings,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
+                self.total_seconds += time.perf_counter() - start
+                self.total_chunks += len(texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(request_texts)].tolist())
+                offset += len(request_texts)
+
+_embedding_service = None
+_embedding_service_lock = threading.Lock()
+
+def get_embedding_service():
+    global _embedding_service
+    with _embedding_service_lock:
+        if _embedding_service is None:
+            embedding_config = config["default_embedding_model"]
+            device = embedding_config.get("device", "auto")
+            cache_config = config.get("embedding_cache", {})
+            cache = None
+            if cache_config.get("enabled", False):
+                cache = EmbeddingCache(cache_config["path"], max_bytes=int(cache_config["max_size_mb"] * 2**20))
+            _embedding_service = EmbeddingService(
+                model_name=embedding_config["model_name"],
+                device=get_torch_device() if device == "auto" else device,
+                batch_size=embedding_config.get("batch_size", 32),
+                max_seq_length=embedding_config.get("max_seq_length", 512),
+                normalize_embeddings=embedding_config.get("normalize_embeddings", True),
+                max_wait_ms=embedding_config.get("max_wait_ms", 10),
+                cache=cache
+            )
+        return _embedding_service
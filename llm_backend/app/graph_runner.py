@@ -0,0 +1,131 @@
+import json
+import queue
+from pprint import pprint
+from langchain_core.callbacks import BaseCallbackHandler
+from app.build_graph import graph_app
+from app.graph_state import create_graph_inputs
+from app.database import ChatSessionManager
+from app.answer_cache import answer_cache
+from app.utils import clear_memory
+from app.workers import inference_pool
+from app.metrics import GRAPH_REQUESTS, GRAPH_LOOPS
+from app.agents import ANSWER_TAG
+import gc
+
+class GenerationTokenHandler(BaseCallbackHandler):
+    """
+    Forwards the tokens of the answer generation LLM calls.
+
+    Graders and routers run on the same model, and the generation graders even run under
+    the `generate` node's metadata (its conditional edge), so only the runs tagged
+    ANSWER_TAG by GenerateAnswerAgent are forwarded.
+    """
+    def __init__(self, events):
+        self.events = events
+        self._generate_runs = set()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        if tags and ANSWER_TAG in tags:
+            self._generate_runs.add(run_id)
+            self.events.put({"event": "generation_start"})
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._generate_runs:
+            self.events.put({"event": "token", "token": token})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._generate_runs.discard(run_id)
+
+def run_graph(question, session_id, events=None, budget_overrides=None):
+    """
+    Runs the graph to completion and stores the exchange in the chat history.
+
+    Args:
+        question (str): user question
+        session_id (str): session key of the video
+        events (queue.Queue): optional queue receiving node and token events
+        budget_overrides (dict): per request values of config['graph_budget']
+
+    Returns:
+        dict: generation under "response" and whether a loop budget ran out under "budget_exhausted"
+    """
+    outcome = "error"
+    try:
+        final_output = None
+        chat_manager = ChatSessionManager(session_id)
+        if answer_cache.enabled:
+            question_embedding = answer_cache.embed(question)
+            cached_answer = answer_cache.get(session_id, question_embedding)
+            if cached_answer is not None:
+                if events is not None:
+                    events.put({"event": "cache_hit"})
+                chat_manager.add_user_message(question)
+                chat_manager.add_ai_message(cached_answer)
+                outcome = "cache_hit"
+                return {"response": cached_answer, "budget_exhausted": False}
+
+        inputs = create_graph_inputs(question, session_id, budget_overrides)
+        callbacks = [GenerationTokenHandler(events)] if events is not None else []
+        loops = {"generate": 0, "transform_query": 0}
+        for output in graph_app.stream(inputs, config={"callbacks": callbacks}):
+            for key, value in output.items():
+                if key in loops:
+                    loops[key] += 1
+                pprint(f"Node '{key}':")
+                pprint(value, indent=2, width=80, depth=None)
+                if events is not None:
+                    events.put({"event": "node", "node": key})
+            final_output = value
+        for node, count in loops.items():
+            GRAPH_LOOPS.labels(node=node).observe(count)
+
+        if final_output and "generation" in final_output:
+            budget_exhausted = final_output.get("budget_exhausted", False)
+            chat_manager.add_user_message(question)
+            chat_manager.add_ai_message(final_output["generation"])
+            # Answers returned on an exhausted budget were not accepted by the graders
+            if answer_cache.enabled and not budget_exhausted:
+                answer_cache.put(session_id, question, question_embedding, final_output["generation"])
+            outcome = "budget_exhausted" if budget_exhausted else "accepted"
+            return {"response": final_output["generation"], "budget_exhausted": budget_exhausted}
+        raise ValueError("Failed to generate a response.")
+    finally:
+        GRAPH_REQUESTS.labels(outcome=outcome).inc()
+        clear_memory()
+        gc.collect()
+
+def stream_graph_events(question, session_id, budget_overrides=None):
+    """
+    Runs the graph on the inference pool and yields its progress as NDJSON lines.
+
+    Events:
+        {"event": "cache_hit"}: the answer comes from the semantic answer cache
+        {"event": "node", "node": name}: a graph node finished
+        {"event": "generation_start"}: a new answer is being generated, discard previous tokens
+        {"event": "token", "token": text}: token of the answer being generated
+        {"event": "final", "response": text, "accepted": bool}: answer after grading,
+            not accepted when it was returned on an exhausted budget
+        {"event": "error", "detail": text}: the graph failed
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            result = run_graph(question, session_id, events, budget_overrides)
+            events.put({"event": "final", "response": result["response"],
+                        "accepted": not result["budget_exhausted"]})
+        except Exception as e:
+            events.put({"event": "error", "detail": str(e)})
+        finally:
+            events.put(None)
+
+    # Submitted before streaming starts so a full queue is still reported as a 503
+    inference_pool.submit(run)
+    return _iter_events(events)
+
+def _iter_events(events):
+    while True:
+        event = events.get()
+        if event is None:
+            break
+        yield json.dumps(event) + "\n"
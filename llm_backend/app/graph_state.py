@@ -1,24 +1,61 @@
 from typing import List
 from typing_extensions import TypedDict
+import time
 from app.agents import *
 from app.tools import retrieve_tool
+from app.router import datasource_router
 from app.llm_chain import create_llm
-from app.utils import calculate_token_count
+from app.context_packer import ContextPacker
+from app.reranker import get_reranker
 from app.database import ChatSessionManager
+from app.utils import config
+from app.metrics import RETRIEVED_DOCUMENTS
 
 class GraphState(TypedDict):
     """
     Represents the state of our graph.
 
     Attributes:
-        question: question
+        question: question, replaced by transform_query with its rewrite
+        original_question: question asked by the user, used to route the datasource
         generation: LLM generation
         documents: list of documents
+        generation_attempts: number of answers generated so far
+        rewrite_count: number of question rewrites so far
+        started_at: epoch time at which the request started
+        budget: max_generate_attempts, max_query_rewrites and max_seconds of the request
+        budget_exhausted: the answer was returned because a budget ran out
     """
     session_id: str
     question: str
+    original_question: str
     generation: str
     documents: List[str]
+    generation_attempts: int
+    rewrite_count: int
+    started_at: float
+    budget: dict
+    budget_exhausted: bool
+
+def create_graph_inputs(question, session_id, budget_overrides=None):
+    """
+    Initial graph state with the budgets of config.yaml, overridden by the request ones
+    """
+    budget = dict(config['graph_budget'])
+    budget.update({key: value for key, value in (budget_overrides or {}).items() if value is not None})
+    return {
+        "question": question,
+        "original_question": question,
+        "session_id": session_id,
+        "generation_attempts": 0,
+        "rewrite_count": 0,
+        "started_at": time.time(),
+        "budget": budget,
+        "budget_exhausted": False,
+    }
+
+def out_of_time(state: GraphState):
+    return time.time() - state["started_at"] >= state["budget"]["max_seconds"]
     
 ### Nodes
 
@@ -43,13 +80,16 @@ def generate(state: GraphState):
         # RAG generation
         generator=None
         generator = GenerateAnswerAgent()
-        calculate_token_count(generator.template, documents, generator.llm.n_ctx)
-        generator.set_llm(create_llm(temperature=0.7))
-        generation = generator.generate_answer({"history": history, 
-                                                "documents": documents, 
+        # Streamed so the answer tokens reach /execute-graph-stream as they are generated
+        generator.set_llm(create_llm(temperature=0.7, streaming=True))
+        # Keep the top-ranked documents and latest history that fit in n_ctx - max_tokens
+        context = ContextPacker(generator.llm).pack(generator.template, question, history, documents)
+        generation = generator.generate_answer({"history": context.history, 
+                                                "documents": context.documents_text, 
                                                 "question": question})
         print(f"Answer generated: {generation}")
-        return {"documents": documents, "question": question, "generation": generation}
+        return {"documents": context.documents, "question": question, "generation": generation,
+                "generation_attempts": state["generation_attempts"] + 1}
     except Exception as e:
         raise Exception(f"Error: {str(e)}")
     finally:
@@ -71,19 +111,35 @@ def grade_documents(state: GraphState):
         question = state["question"]
         documents = state["documents"]
         docs_grader=None
-        docs_grader=GraderDocsAgent()
-        # Score each doc
+        scores=None
+        if config['grading']['mode'] == "reranker":
+            # One batched cross-encoder pass on CPU instead of LLM calls
+            scores = get_reranker().grade(question, documents)
+        elif config['grading']['mode'] == "batch" and documents:
+            # Score all docs in a single constrained call
+            try:
+                docs_grader=BatchGraderDocsAgent(n_documents=len(documents))
+                scores = docs_grader.grade_docs({
+                    "documents": "\n\n".join(f"Document {i}:\n{d.page_content}" for i, d in enumerate(documents, 1)),
+                    "question": question
+                })
+            except ValueError as e:
+                print(f"---BATCH GRADING FAILED ({str(e)}), GRADING EACH DOCUMENT---")
+                scores=None
+        if scores is None:
+            # Score each doc
+            docs_grader=GraderDocsAgent()
+            scores = [docs_grader.grade_doc({"document": d.page_content, "question": question})
+                      for d in documents]
         filtered_docs = []
-        for d in documents:
-            score = docs_grader.grade_doc(
-                {"document": d.page_content, "question": question}
-            )
+        for d, score in zip(documents, scores):
             if score.lower() == "yes":
                 print("---GRADE: DOCUMENT RELEVANT---")
                 filtered_docs.append(d)
             else:
                 print("---GRADE: DOCUMENT NOT RELEVANT---")
                 continue
+        RETRIEVED_DOCUMENTS.labels(stage="relevant").observe(len(filtered_docs))
         return {"documents": filtered_docs, "question": question}
     except Exception as e:
         raise Exception(f"Error: {str(e)}")
@@ -108,7 +164,8 @@ def transform_query(state: GraphState):
         question_rewriter = QuestionRewriterAgent()
         # Re-write question
         better_question = question_rewriter.rewrite_question({"question": question})
-        return {"documents": documents, "question": better_question}
+        return {"documents": documents, "question": better_question,
+                "rewrite_count": state["rewrite_count"] + 1}
     
     except Exception as e:
         raise Exception(f"Error: {str(e)}")
@@ -127,24 +184,37 @@ def search_docs(state: GraphState):
     """
     try:
         retriever=None
-        question_router=None
         print("---SEARCH DOCS---")
         question = state["question"]
         session_id = state["session_id"]
         print(question)
-        question_router = DocAgent()
-        source = question_router.datasource({"question": question})
-        target = source.lower()
+        # Rewrites only rephrase the question: route on the original one so the memoized
+        # decision is reused on every rewrite loop
+        target = datasource_router.route(session_id, state.get("original_question", question))
         print(f"---{target} DATASOURCE TO RAG---")
         tool_input = {"target": target,"session_id": session_id}
         retriever = retrieve_tool.run(tool_input)
         documents = retriever.get_relevant_documents(question)
+        RETRIEVED_DOCUMENTS.labels(stage="retrieved").observe(len(documents))
         return {"documents": documents, "question": question}
     except Exception as e:
         raise Exception(f"Error using retrieve tool: {str(e)}")
     finally:
-        del retriever, question_router
+        del retriever
     
+def finish_on_budget(state: GraphState):
+    """
+    Stop the loop and return the latest generation, flagged as not accepted.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): Sets budget_exhausted
+    """
+    print("---BUDGET EXHAUSTED, RETURNING THE LATEST GENERATION---")
+    return {"generation": state["generation"], "budget_exhausted": True}
+
 ### Edges ###
 
 def decide_to_generate(state: GraphState):
@@ -162,7 +232,17 @@ def decide_to_generate(state: GraphState):
         state["question"]
         filtered_documents = state["documents"]
 
+        if out_of_time(state) and state.get("generation"):
+            # Relevant documents or not, another generate would run past max_seconds
+            print("---DECISION: OUT OF TIME, RETURN THE LATEST GENERATION---")
+            return "budget exhausted"
         if not filtered_documents:
+            if state["rewrite_count"] >= state["budget"]["max_query_rewrites"] or out_of_time(state):
+                if state.get("generation"):
+                    return "budget exhausted"
+                # Nothing to return yet: answer once without documents
+                print("---DECISION: REWRITE BUDGET EXHAUSTED, GENERATE---")
+                return "generate"
             # All documents have been filtered check_relevance
             # We will re-generate a new query
             print(
@@ -193,6 +273,9 @@ def grade_generation_v_documents_and_question(state: GraphState):
         generation = state["generation"]
         generation_grader=None
         answer_grader=None
+        budget = state["budget"]
+        if out_of_time(state):
+            return "budget exhausted"
         
         generation_grader = DocAnswerAgent()
         score = generation_grader.grade_generation(
@@ -211,9 +294,13 @@ def grade_generation_v_documents_and_question(state: GraphState):
                 return "useful"
             else:
                 print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
+                if state["rewrite_count"] >= budget["max_query_rewrites"]:
+                    return "budget exhausted"
                 return "not useful"
         else:
             print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
+            if state["generation_attempts"] >= budget["max_generate_attempts"]:
+                return "budget exhausted"
             return "not supported"
     except Exception as e:
         raise Exception(f"Error: {str(e)}")
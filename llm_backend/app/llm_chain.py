@@ -1,50 +1,176 @@
 from langchain_community.llms import LlamaCpp
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.memory import ConversationBufferWindowMemory
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
+from llama_cpp import LlamaGrammar, LlamaRAMCache, LlamaDiskCache
 import chromadb
 from app.utils import load_config
-import torch
+from app.embedding_service import get_embedding_service
+from app import prompt_templates
+from app.metrics import observe_model_load
+import os
+import threading
+import time
+from typing import Any
 
 # Load configuration yaml
 config=load_config()
 
+class PooledLlamaCpp(LlamaCpp):
+    """
+    LlamaCpp whose copies share one llama.cpp client, which is not thread-safe: every
+    completion holds the model's inference lock, so two agents never interleave their
+    evaluations in the same KV cache whatever thread or pool they run on.
+    """
+    # Shared by reference through model_copy. Reentrant because _call streams through _stream
+    inference_lock: Any = None
+    # {"prompt_tokens", "completion_tokens"} of the latest call of this copy
+    last_usage: Any = None
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        with self.inference_lock:
+            self.last_usage = None
+            if self.streaming:
+                return super()._call(prompt, stop, run_manager, **kwargs)
+            # Same request as LlamaCpp._call, keeping the token usage llama.cpp returns
+            result = self.client(prompt=prompt, **{**self._get_parameters(stop), **kwargs})
+            self.last_usage = result["usage"]
+            return result["choices"][0]["text"]
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        with self.inference_lock:
+            self.last_usage = None
+            completion_tokens = 0
+            for chunk in super()._stream(prompt, stop, run_manager, **kwargs):
+                # llama.cpp streams one chunk per sampled token
+                completion_tokens += 1
+                yield chunk
+            # Streamed completions carry no usage: only the prompt is tokenized again
+            self.last_usage = {"prompt_tokens": len(self.client.tokenize(prompt.encode("utf-8"))),
+                               "completion_tokens": completion_tokens}
+
+class LlamaModelPool:
+    """
+    Keeps a single resident LlamaCpp instance per GGUF model for the whole process.
+
+    Agents never own a model: they borrow a lightweight copy of the pooled instance
+    that shares the loaded llama.cpp client but carries its own sampling parameters.
+    """
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_path):
+        # Accept either a key of `llama_cpp_models` or a path to a .gguf file
+        model_path = config['llama_cpp_models'].get(model_path, model_path)
+        with self._lock:
+            llm = self._models.get(model_path)
+            if llm is None:
+                start = time.perf_counter()
+                llm = PooledLlamaCpp(
+                    model_path=model_path,
+                    inference_lock=threading.RLock(),
+                    n_gpu_layers=config['llama-param']['gpu_layers'],
+                    n_batch=config['llama-param']['n_batch'],
+                    n_ctx=config['llama-param']['n_ctx'],
+                    f16_kv=True,
+                    verbose=False
+                )
+                if config['prompt_cache']['enabled']:
+                    llm.client.set_cache(create_prompt_cache())
+                self._models[model_path] = llm
+                load_seconds = time.perf_counter() - start
+                observe_model_load("llm", os.path.basename(model_path), load_seconds)
+                print(f"Model {model_path} loaded in {load_seconds:.2f}s")
+            return llm
+
+    def preload(self):
+        for model_path in config['llama_cpp_models'].values():
+            self.get(model_path)
+            if config['prompt_cache']['enabled'] and config['prompt_cache']['warm_templates']:
+                self.warm_prompt_cache(model_path)
+
+    def warm_prompt_cache(self, model_path):
+        """
+        Evaluate the fixed instruction prefix of every agent template once and store
+        its KV state, so the first call of each agent only evaluates its variable part.
+        """
+        llm = self.get(model_path)
+        with llm.inference_lock:
+            for name in dir(prompt_templates):
+                template = getattr(prompt_templates, name)
+                if not name.endswith("_template") or not isinstance(template, str):
+                    continue
+                # Templates without placeholders are fixed prompts: warm them whole
+                placeholder = template.find("{")
+                prefix = template if placeholder == -1 else template[:placeholder]
+                tokens = llm.client.tokenize(prefix.encode("utf-8"))
+                llm.client.reset()
+                llm.client.eval(tokens)
+                llm.client.cache[tokens] = llm.client.save_state()
+            print(f"Prompt cache warmed for {model_path}")
+
+def create_prompt_cache():
+    """
+    llama.cpp resumes a prompt from the cached KV state sharing its longest prefix,
+    so only the tokens after the shared prefix are evaluated.
+    """
+    cache_config = config['prompt_cache']
+    if cache_config['backend'] == "disk":
+        return LlamaDiskCache(cache_dir=cache_config['disk_path'], capacity_bytes=cache_config['capacity_bytes'])
+    return LlamaRAMCache(capacity_bytes=cache_config['capacity_bytes'])
+
+llama_model_pool = LlamaModelPool()
+
+class GrammarRegistry:
+    """
+    Parses each GBNF file once and hands out the compiled LlamaGrammar.
+
+    A grammar is parsed again only when the modification time of its file changes.
+    llama.cpp resets the grammar state at the start of every generation, so the same
+    compiled object can be reused by consecutive calls on the pooled model.
+    """
+    def __init__(self):
+        self._grammars = {}
+        self._lock = threading.Lock()
+
+    def get(self, grammar_path):
+        mtime = os.path.getmtime(grammar_path)
+        with self._lock:
+            cached = self._grammars.get(grammar_path)
+            if cached is None or cached[0] != mtime:
+                start = time.perf_counter()
+                grammar = LlamaGrammar.from_file(grammar_path, verbose=False)
+                print(f"Grammar {grammar_path} parsed in {(time.perf_counter() - start) * 1000:.1f}ms")
+                cached = (mtime, grammar)
+                self._grammars[grammar_path] = cached
+            return cached[1]
+
+    def preload(self):
+        for grammar_path in config['grammar'].values():
+            self.get(grammar_path)
+
+grammar_registry = GrammarRegistry()
+
 def create_llm(model_path=config['llama_cpp_models']['mistral-7b-8q'],
-               temperature=0.1, stop=[], grammar_path=None):
-    llm = LlamaCpp(
-            model_path=model_path,
-            n_gpu_layers=config['llama-param']['gpu_layers'],
-            n_batch=config['llama-param']['n_batch'],
-            max_tokens=256,
-            temperature=temperature, 
-            n_ctx=2048,
-            f16_kv=True,
-            verbose=False,
-            grammar_path=grammar_path,
-            stop=stop
-        )
+               temperature=0.1, stop=[], grammar_path=None, max_tokens=256, streaming=False):
+    grammar = grammar_registry.get(grammar_path) if grammar_path else None
+    # model_copy does not run the validators, so the pooled llama.cpp client is reused.
+    # Only calls whose tokens are forwarded to the user need streaming
+    llm = llama_model_pool.get(model_path).model_copy(update={
+        "temperature": temperature,
+        "stop": list(stop),
+        "max_tokens": max_tokens,
+        "grammar": grammar,
+        "streaming": streaming
+    })
     return llm
 
 def create_bge_embeddings():
-    model_name=config["default_embedding_model"]["model_name"]
-    
-    # Check available devices in order of preference: CUDA (GPU), MPS (Apple Silicon), then CPU
-    if torch.cuda.is_available():
-        device = "cuda"
-    elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-        device = "mps"
-    else:
-        device = "cpu"
-    
-    embedding = HuggingFaceBgeEmbeddings(
-        model_name=model_name, 
-        model_kwargs={"device": device}, 
-        encode_kwargs={"normalize_embeddings": True},
-        # https://huggingface.co/BAAI/bge-m3#faq
-        query_instruction = "") 
-    return embedding
+    # Shared instance: the model is loaded once per process.
+    # bge-m3 needs no query instruction (https://huggingface.co/BAAI/bge-m3#faq)
+    return get_embedding_service()
 
 def create_chat_memory(chat_history):# only keep the last k interactions in memory
     return ConversationBufferWindowMemory(memory_key="history", chat_memory=chat_history, k=3)
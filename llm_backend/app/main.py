@@ -1,72 +1,113 @@
 # app/main.py
 
 from fastapi import FastAPI, HTTPException
-from app.model_manager import download_model, list_downloaded_models, run_sentimental_analysis_model
+from fastapi.responses import StreamingResponse, Response
+from app.model_manager import download_model, list_downloaded_models, run_sentimental_analysis_model, analyze_session_sentiment
 from app.database import ChatSessionManager
-from app.utils import generate_valid_session_id, clear_memory
+from app.utils import generate_valid_session_id, config
 from app.custom_classes import *
-from app.build_graph import graph_app  
-from pprint import pprint
-import gc 
+from app.tools import index_session_documents, index_new_comments
+from app.graph_runner import run_graph, stream_graph_events
+from app.workers import inference_pool, sentiment_pool, ingestion_pool
+from app.answer_cache import answer_cache
+from app.llm_chain import llama_model_pool, grammar_registry
+from app.metrics import render_metrics
+from app.reranker import get_reranker
 
 app = FastAPI()
 
+@app.on_event("startup")
+def load_llm_models():
+    # Load the GGUF models and grammars once so the first question does not pay for it
+    if config['llama-param'].get('preload', False):
+        llama_model_pool.preload()
+    grammar_registry.preload()
+    if config['grading']['mode'] == "reranker":
+        get_reranker()
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus scrape endpoint
+    """
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
 
 @app.post("/execute-graph")
 async def execute_graph(query: QueryModel):
     try:
-        final_output = None
-        output = None
-        inputs = None
         session_id = generate_valid_session_id(query.video_url)
-        inputs = {"question": query.question, "session_id": session_id}
-        for output in graph_app.stream(inputs):
-            for key, value in output.items():
-                pprint(f"Node '{key}':")
-                pprint(value, indent=2, width=80, depth=None)
-            final_output = value
-                
-        if final_output and "generation" in final_output:
-            chat_manager = ChatSessionManager(session_id)
-            chat_manager.add_user_message(query.question)
-            chat_manager.add_ai_message(final_output["generation"])
-            return {"response": final_output["generation"]}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to generate a response.")
-    
+        return await inference_pool.run(run_graph, query.question, session_id,
+                                        query.budget_overrides())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        clear_memory()
-        if final_output and output and inputs:
-            del final_output, output, inputs
-        gc.collect()
+
+@app.post("/execute-graph-stream")
+def execute_graph_stream(query: QueryModel):
+    """
+    Same as /execute-graph but streams node transitions and answer tokens as NDJSON.
+    """
+    session_id = generate_valid_session_id(query.video_url)
+    return StreamingResponse(stream_graph_events(query.question, session_id, query.budget_overrides()),
+                             media_type="application/x-ndjson")
+
+def ingest_video_session(video: VideoSessionModel):
+    session_id = generate_valid_session_id(video.video_url)
+    chat_manager = ChatSessionManager(session_id)
+    chat_manager.add_video_session(
+        video_title=video.video_title,
+        video_url=video.video_url,
+        channel_title=video.channel_title,
+        description=video.description,
+        publish_date=video.publish_date,
+        duration=video.duration,
+        replace_existing=video.replace_existing
+    )
+    chat_manager.add_documents_to_db(video.transcript, 
+                                    video.comments, 
+                                    video.replace_existing)
+    index_session_documents(session_id, video.replace_existing)
+    if video.replace_existing:
+        answer_cache.invalidate(session_id)
 
 @app.post("/add-session")
 async def add_video_session(video: VideoSessionModel):
     try:
-        session_id = generate_valid_session_id(video.video_url)
-        chat_manager = ChatSessionManager(session_id)
-        chat_manager.add_video_session(
-            video_title=video.video_title,
-            video_url=video.video_url,
-            channel_title=video.channel_title,
-            description=video.description,
-            publish_date=video.publish_date,
-            duration=video.duration,
-            replace_existing=video.replace_existing
-        )
-        chat_manager.add_documents_to_db(video.transcript, 
-                                        video.comments, 
-                                        video.replace_existing)
-                
+        await ingestion_pool.run(ingest_video_session, video)
         return {"message": "Session loaded successfully.", "session_id": video.video_url}
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def refresh_video_session(refresh: RefreshSessionModel):
+    session_id = generate_valid_session_id(refresh.video_url)
+    chat_manager = ChatSessionManager(session_id)
+    new_comments = chat_manager.append_comments(refresh.comments)
+    if new_comments:
+        index_new_comments(session_id, new_comments)
+        answer_cache.invalidate(session_id)
+    return len(new_comments)
+
+@app.post("/refresh-session")
+async def refresh_session(refresh: RefreshSessionModel):
+    """
+    Append the comments newer than the latest stored one and embed only their chunks.
+    """
+    try:
+        new_comments = await ingestion_pool.run(refresh_video_session, refresh)
+        return {"message": "Session refreshed.", "new_comments": new_comments}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Read endpoints are plain functions so FastAPI serves them from its own threadpool
 @app.get("/get-video-details")
-async def get_transcript(videlo_url: str):
+def get_transcript(videlo_url: str):
     try:
         session_id = generate_valid_session_id(videlo_url)
         chat_manager = ChatSessionManager(session_id)
@@ -76,7 +117,7 @@ async def get_transcript(videlo_url: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get-transcript")
-async def get_transcript(videlo_url: str):
+def get_transcript(videlo_url: str):
     try:
         session_id = generate_valid_session_id(videlo_url)
         chat_manager = ChatSessionManager(session_id)
@@ -86,7 +127,7 @@ async def get_transcript(videlo_url: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get-comments")
-async def get_comments(videlo_url: str):
+def get_comments(videlo_url: str):
     try:
         session_id = generate_valid_session_id(videlo_url)
         chat_manager = ChatSessionManager(session_id)
@@ -95,8 +136,17 @@ async def get_comments(videlo_url: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/get-latest-comment-time")
+def get_latest_comment_time(videlo_url: str):
+    try:
+        session_id = generate_valid_session_id(videlo_url)
+        chat_manager = ChatSessionManager(session_id)
+        return {"latest_published_at": chat_manager.get_latest_comment_time()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/get-chat-history")
-async def get_chat_history(request: ChatHistoryRequest):
+def get_chat_history(request: ChatHistoryRequest):
     try:
         session_id = generate_valid_session_id(request.video_url)
         chat_manager = ChatSessionManager(session_id)
@@ -112,20 +162,35 @@ async def download_model_endpoint(request: DownloadModelRequest):
     access_token = request.access_token
     
     try:
-        download_message = download_model(model_name, model_type, access_token)
+        download_message = await ingestion_pool.run(download_model, model_name, model_type, access_token)
         return {"message": download_message}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/run-sentimental-model")
 async def run_sentimental(request: RunSentimentalModel):
-    result = run_sentimental_analysis_model(request.input_data)
+    result = await sentiment_pool.run(run_sentimental_analysis_model, request.input_data)
     if "error" in result:
         raise HTTPException(status_code=404, detail=result["error"])
     return result
 
+@app.post("/session-sentiment")
+async def session_sentiment(request: SessionSentimentRequest):
+    """
+    Sentiment of the comments stored for a session: overall, like-weighted and per day.
+    """
+    session_id = generate_valid_session_id(request.video_url)
+    try:
+        return await sentiment_pool.run(analyze_session_sentiment, session_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/models")
-async def list_models():
+def list_models():
     """
     Lista todos los modelos descargados.
     """
@@ -0,0 +1,77 @@
+import functools
+import time
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# LLM calls last from a few milliseconds (cached routing) to minutes (long answers on CPU)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+GRAPH_NODE_SECONDS = Histogram(
+    "graph_node_duration_seconds",
+    "Time spent in each LangGraph node or conditional edge",
+    ["node"], buckets=LATENCY_BUCKETS)
+GRAPH_REQUESTS = Counter(
+    "graph_requests_total",
+    "Questions answered by the graph by outcome (accepted, budget_exhausted, cache_hit, error)",
+    ["outcome"])
+GRAPH_LOOPS = Histogram(
+    "graph_loop_iterations",
+    "Number of generate and transform_query runs per question",
+    ["node"], buckets=(0, 1, 2, 3, 4, 5, 8))
+
+AGENT_SECONDS = Histogram(
+    "agent_duration_seconds",
+    "Time of a full agent call (prompt, LLM and parser) per agent type",
+    ["agent"], buckets=LATENCY_BUCKETS)
+LLM_PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent to the LLM per agent type", ["agent"])
+LLM_COMPLETION_TOKENS = Counter(
+    "llm_completion_tokens_total", "Completion tokens generated by the LLM per agent type", ["agent"])
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second",
+    "Completion tokens per second of each LLM call per agent type",
+    ["agent"], buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200))
+
+RETRIEVED_DOCUMENTS = Histogram(
+    "retrieval_documents",
+    "Documents returned by the retriever (retrieved) and kept by the grader (relevant)",
+    ["stage"], buckets=(0, 1, 2, 3, 4, 5, 8, 10, 20))
+
+MODEL_LOADS = Counter(
+    "model_loads_total", "Models loaded into memory by kind (llm, embedding, sentiment)", ["kind", "model"])
+MODEL_LOAD_SECONDS = Histogram(
+    "model_load_duration_seconds", "Time to load a model into memory", ["kind"], buckets=LATENCY_BUCKETS)
+
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "embedding_cache_lookups_total", "Texts looked up in the on-disk embedding cache by result (hit, miss)", ["result"])
+EMBEDDING_CACHE_BYTES = Gauge(
+    "embedding_cache_bytes", "Size of the vectors stored in the on-disk embedding cache")
+
+def timed_node(name, fn):
+    """
+    Wrap a graph node or edge function so its duration is observed under `name`
+    """
+    @functools.wraps(fn)
+    def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return fn(state)
+        finally:
+            GRAPH_NODE_SECONDS.labels(node=name).observe(time.perf_counter() - start)
+    return wrapper
+
+def observe_llm_call(agent, prompt_tokens, completion_tokens, llm_seconds):
+    LLM_PROMPT_TOKENS.labels(agent=agent).inc(prompt_tokens)
+    LLM_COMPLETION_TOKENS.labels(agent=agent).inc(completion_tokens)
+    if llm_seconds > 0:
+        LLM_TOKENS_PER_SECOND.labels(agent=agent).observe(completion_tokens / llm_seconds)
+
+def observe_model_load(kind, model, seconds):
+    MODEL_LOADS.labels(kind=kind, model=model).inc()
+    MODEL_LOAD_SECONDS.labels(kind=kind).observe(seconds)
+
+def render_metrics():
+    """
+    Returns:
+        tuple: exposition payload and its content type
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
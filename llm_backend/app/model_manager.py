@@ -1,8 +1,12 @@
 # app/model_manager.py
-from transformers import pipeline, AutoModel, AutoTokenizer, AutoModelForSequenceClassification
+from transformers import AutoModel, AutoTokenizer, AutoModelForSequenceClassification
 from typing import Optional, Dict, Any
 import os
-from app.utils import load_config
+import threading
+import time
+from app.utils import load_config, get_torch_device
+from app.metrics import observe_model_load
+from app.database import ChatSessionManager
 from app.lib import MODEL_CLASS_MAPPING, MODEL_TYPE_TO_TASK_MAPPING
 import torch
 
@@ -84,55 +88,108 @@ def list_downloaded_models() -> Dict[str, str]:
             models[model_name] = model_path
     return models
 
+_sentiment_model = None
+_sentiment_model_lock = threading.Lock()
+
+def load_sentiment_model():
+    """
+    Load the default sentiment model once and keep it resident
+
+    Returns:
+        tuple: model, tokenizer and torch device
+    """
+    global _sentiment_model
+    with _sentiment_model_lock:
+        if _sentiment_model is None:
+            start = time.perf_counter()
+            if not is_model_downloaded(DEFAULT_SENTIMENTAL_MODEL):
+                download_model(DEFAULT_SENTIMENTAL_MODEL, "sequence-classification")
+
+            sanitized_model_name = DEFAULT_SENTIMENTAL_MODEL.replace('/', '_')
+            model_path = os.path.join(MODEL_DIR, sanitized_model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(model_path)
+            tokenizer = AutoTokenizer.from_pretrained(model_path)
+            device = torch.device(get_torch_device())
+            model.to(device)
+            model.eval()
+            _sentiment_model = (model, tokenizer, device)
+            observe_model_load("sentiment", DEFAULT_SENTIMENTAL_MODEL, time.perf_counter() - start)
+        return _sentiment_model
+
+def score_sentiment(phrases: list[str]) -> list[Dict[str, float]]:
+    """
+    Score each phrase with the resident sentiment model
+
+    Args:
+        phrases (list[str]): texts to classify
+
+    Returns:
+        list[Dict[str, float]]: label probabilities of each phrase, in input order
+    """
+    model, tokenizer, device = load_sentiment_model()
+    batch_size = config["sentiment"]["batch_size"]
+    labels = [model.config.id2label[i].lower() for i in range(model.config.num_labels)]
+
+    # Sorting by length keeps the padding of each batch small
+    order = sorted(range(len(phrases)), key=lambda i: len(phrases[i]))
+    scores = [None] * len(phrases)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch_indexes = order[start:start + batch_size]
+            inputs = tokenizer(
+                [phrases[i] for i in batch_indexes],
+                padding=True,
+                truncation=True,
+                max_length=config["sentiment"]["max_length"],
+                return_tensors="pt"
+            ).to(device)
+            probabilities = torch.softmax(model(**inputs).logits, dim=-1).cpu().tolist()
+            for i, phrase_probabilities in zip(batch_indexes, probabilities):
+                scores[i] = dict(zip(labels, phrase_probabilities))
+    return scores
+
 def run_sentimental_analysis_model(phrases: list[str]) -> Optional[Dict[str, Any]]:
-    
-    if not is_model_downloaded(DEFAULT_SENTIMENTAL_MODEL):
-        try:
-            download_model(DEFAULT_SENTIMENTAL_MODEL,"sequence-classification")
-        except Exception as e:
-            return e
-    
-    model_name=DEFAULT_SENTIMENTAL_MODEL
-    sanitized_model_name = model_name.replace('/', '_')
-    model_path = os.path.join(MODEL_DIR, sanitized_model_name)
-    
     try:
-        llm = AutoModelForSequenceClassification.from_pretrained(model_path)
+        load_sentiment_model()
     except Exception as e:
-        return {"error": f"Error loading model '{model_name}': {e}"}
-
+        return {"error": f"Error loading model '{DEFAULT_SENTIMENTAL_MODEL}': {e}"}
     try:
-        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        scores = score_sentiment(phrases)
     except Exception as e:
-        return {"error": f"Error loading tokennizer '{model_name}': {e}"}
-    
-    # Check for available device in the order: CUDA (GPU) -> MPS (Apple Silicon) -> CPU
-    if torch.cuda.is_available():
-        device_index = 0  # Using the first available GPU
-    elif torch.backends.mps.is_available():
-        device_index = 0  # MPS does not require an index, but this is for compatibility with the pipeline's device argument
-    else:
-        device_index = -1  # CPU is represented with -1 in the pipeline's device argument
-
-    # Initialize the pipeline
-    pipe = pipeline(
-        task="text-classification",
-        model=llm,
-        tokenizer=tokenizer,
-        return_all_scores=True,
-        device=device_index,  # GPU/MPS if available, otherwise CPU
-        max_length=512,
-        truncation=True
-    )
-    total_scores = {'positive': 0.0, 'neutral': 0.0, 'negative': 0.0}
+        print(f"Sentiment scoring of {len(phrases)} phrases failed: {e}")
+        return {"error": f"Error scoring the phrases with model '{DEFAULT_SENTIMENTAL_MODEL}': {e}"}
 
-    for phrase in phrases:
-        results = pipe(phrase)
-        for result in results:
-            for label_score in result:
-                total_scores[label_score['label'].lower()] += label_score['score']
+    total_scores = {'positive': 0.0, 'neutral': 0.0, 'negative': 0.0}
+    for phrase_scores in scores:
+        for label, score in phrase_scores.items():
+            total_scores[label] = total_scores.get(label, 0.0) + score
 
-    num_phrases = len(phrases)
+    num_phrases = max(len(phrases), 1)
     avg_scores = {label: score / num_phrases for label, score in total_scores.items()}
 
     return avg_scores
+
+def analyze_session_sentiment(session_id: str) -> Dict[str, Any]:
+    """
+    Score the stored comments of a session and return the SQL rollups
+
+    Only comment texts without a stored score for the default model go through the
+    model, so repeated calls on the same session cost a couple of queries.
+
+    Args:
+        session_id (str): session key of the video
+
+    Returns:
+        dict: rollups of ChatSessionManager.get_sentiment_rollups plus "newly_scored"
+    """
+    chat_manager = ChatSessionManager(session_id)
+    unscored = chat_manager.get_unscored_comments(DEFAULT_SENTIMENTAL_MODEL)
+    if unscored:
+        start = time.perf_counter()
+        text_hashes, texts = zip(*unscored)
+        scores = score_sentiment(list(texts))
+        chat_manager.save_comment_sentiment(DEFAULT_SENTIMENTAL_MODEL, text_hashes, scores)
+        print(f"{len(texts)} comments scored for session {session_id} in {time.perf_counter() - start:.2f}s")
+    rollups = chat_manager.get_sentiment_rollups(DEFAULT_SENTIMENTAL_MODEL)
+    rollups["newly_scored"] = len(unscored)
+    return rollups
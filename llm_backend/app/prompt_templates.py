@@ -1,23 +1,36 @@
 
+# Fixed instructions come first and the variable parts last, so consecutive calls
+# share the longest possible prompt prefix and llama.cpp can resume its KV state
 datasource_template = """
 You are an expert at analyzing content from a video. Your task is to determine the most relevant data source for answering a user's question.\n
-Given the question: "{question}", decide which of the following is most appropriate:\n
+Decide which of the following is most appropriate for the question below:\n
 - "transcript" : if the question is best answered by the video's transcript.\n
 - "comments" : if the question is best answered by the user comments.\n
 - "both" : if the question requires information from both the transcript and the comments.\n
 Provide your answer as a single JSON object with a single key 'target' and one of the three values ("transcript", "comments", or "both"). No additional text or explanations.\n
+Question: "{question}"\n
 """
 
 
 doc_grader_template="""You are a grader assessing relevance of a retrieved document to a user question. \n 
-    Here is the retrieved document: \n\n {document} \n\n
-    Here is the user question: {question} \n
     If the document contains keywords related to the user question, grade it as relevant. \n
     It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
     Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question. \n
-    Provide the binary score as a JSON with a single key 'score' and no premable or explanation. Ensure that the JSON is correctly formatted."""
+    Provide the binary score as a JSON with a single key 'score' and no premable or explanation. Ensure that the JSON is correctly formatted. \n
+    Here is the user question: {question} \n
+    Here is the retrieved document: \n\n {document} \n\n"""
+
+batch_doc_grader_template="""You are a grader assessing relevance of retrieved documents to a user question. \n 
+    If a document contains keywords related to the user question, grade it as relevant. \n
+    It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
+    Give a binary score 'yes' or 'no' for each document to indicate whether it is relevant to the question. \n
+    Provide the scores as a JSON list with one object per document, in the same order, each with a single key 'score' and no premable or explanation. Ensure that the JSON is correctly formatted. \n
+    Here is the user question: {question} \n
+    Here are the retrieved documents, numbered in order: \n\n {documents} \n\n"""
 
 generater_template="""You are an AI assistant specialized in answering questions based on provided information. \n
+    Answer the question at the end clearly and concisely, based on the conversation history and the relevant documents. \n
+    Provide your answer with no additional context or explanation. \n
     Conversation History:
     {history}
     \n ------- \n
@@ -25,26 +38,25 @@ generater_template="""You are an AI assistant specialized in answering questions
     \n ------- \n
     {documents}
     \n ------- \n
-    Based on this information, answer the following question clearly and concisely: {question} \n
-    Provide your answer with no additional context or explanation."""
+    Question: {question} \n"""
  
 answer_v_docs_grader_template="""You are a grader assessing whether an answer is grounded in / supported by a set of facts. \n 
+    Give a binary score 'yes' or 'no' score to indicate whether the answer is grounded in / supported by a set of facts. \n
+    Provide the binary score as a JSON with a single key 'score' and no preamble or explanation. Ensure that the JSON is correctly formatted. \n
     Here are the facts:
     \n ------- \n
     {documents} 
     \n ------- \n
-    Here is the answer: {generation}
-    Give a binary score 'yes' or 'no' score to indicate whether the answer is grounded in / supported by a set of facts. \n
-    Provide the binary score as a JSON with a single key 'score' and no preamble or explanation. Ensure that the JSON is correctly formatted."""
+    Here is the answer: {generation}"""
 
 final_answer_grader_template="""You are a grader assessing whether an answer is useful to resolve a question. \n 
+    Give a binary score 'yes' or 'no' to indicate whether the answer is useful to resolve a question. \n
+    Provide the binary score as a JSON with a single key 'score' and no preamble or explanation. Ensure that the JSON is correctly formatted. \n
+    Here is the question: {question}
     Here is the answer:
     \n ------- \n
     {generation} 
-    \n ------- \n
-    Here is the question: {question}
-    Give a binary score 'yes' or 'no' to indicate whether the answer is useful to resolve a question. \n
-    Provide the binary score as a JSON with a single key 'score' and no preamble or explanation. Ensure that the JSON is correctly formatted."""
+    \n ------- \n"""
 
 rewriter_template="""You are a question re-writer that converts an input question to a better version that is optimized \n 
      for vectorstore retrieval. Look at the initial and formulate an improved question. \n
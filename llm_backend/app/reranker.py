@@ -0,0 +1,62 @@
+import threading
+import time
+from sentence_transformers import CrossEncoder
+from app.utils import config
+from app.metrics import observe_model_load
+
+class DocumentReranker:
+    """
+    Small cross-encoder kept resident on CPU that scores (question, document) pairs.
+
+    All retrieved documents of a question go through the model in one batched forward
+    pass; documents scoring at least `threshold` are graded relevant, replacing the
+    yes/no grade of the LLM grader.
+    """
+    def __init__(self, model_name, device="cpu", max_length=512, batch_size=32, threshold=0.5):
+        start = time.perf_counter()
+        self.model_name = model_name
+        # Single label cross-encoders get a sigmoid activation: scores are in [0, 1]
+        self.model = CrossEncoder(model_name, device=device, max_length=max_length)
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        load_seconds = time.perf_counter() - start
+        observe_model_load("reranker", model_name, load_seconds)
+        print(f"Reranker {model_name} loaded on {device} in {load_seconds:.2f}s")
+
+    def score(self, question, documents):
+        """
+        Returns:
+            list[float]: relevance of each document to the question, in input order
+        """
+        if not documents:
+            return []
+        pairs = [(question, document.page_content) for document in documents]
+        with self._lock:
+            scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return [float(score) for score in scores]
+
+    def grade(self, question, documents, threshold=None):
+        """
+        Returns:
+            list[str]: "yes" or "no" for each document, like the LLM graders
+        """
+        threshold = self.threshold if threshold is None else threshold
+        return ["yes" if score >= threshold else "no" for score in self.score(question, documents)]
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_reranker():
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            reranker_config = config["grading"]["reranker"]
+            _reranker = DocumentReranker(
+                model_name=reranker_config["model_name"],
+                device=reranker_config.get("device", "cpu"),
+                max_length=reranker_config.get("max_length", 512),
+                batch_size=reranker_config.get("batch_size", 32),
+                threshold=reranker_config.get("threshold", 0.5)
+            )
+        return _reranker
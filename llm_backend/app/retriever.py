@@ -0,0 +1,68 @@
+import re
+from typing import Any, List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema.document import Document
+from app.database import ChatSessionManager
+
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
+def build_match_query(question):
+    """
+    FTS5 MATCH expression for a free-text question.
+
+    Quoted phrases are kept as phrase queries and every other word becomes a quoted
+    term, all joined with OR so BM25 ranks chunks by how many rare terms they share.
+    Quoting every term keeps FTS5 operators and punctuation in the question from
+    being parsed as query syntax.
+    """
+    phrases = [phrase.strip() for phrase in re.findall(r'"([^"]+)"', question)]
+    words = re.findall(r"\w+", re.sub(r'"[^"]*"', " ", question))
+    terms = [f'"{term}"' for term in phrases + words if term]
+    return " OR ".join(dict.fromkeys(terms))
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merge ranked document lists: each document scores sum(1 / (k + rank)) over the lists
+    it appears in, so agreement between rankers matters more than raw scores.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, 1):
+            key = (document.metadata.get("source"), document.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+class SessionRetriever(BaseRetriever):
+    """
+    Retrieves the chunks of a session from the Chroma collection (dense), the FTS5
+    index (lexical) or both merged with reciprocal rank fusion (hybrid).
+    """
+    session_id: str
+    source: Optional[str] = None
+    mode: str = "hybrid"
+    vectordb: Any = None
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _dense_search(self, query, k):
+        search_filter = {"source": self.source} if self.source else None
+        return self.vectordb.similarity_search(query, k=k, filter=search_filter)
+
+    def _lexical_search(self, query, k):
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+        rows = ChatSessionManager(self.session_id).search_lexical(match_query, self.source, k)
+        return [Document(page_content=content, metadata={"source": source}) for content, source in rows]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self.mode == "dense":
+            return self._dense_search(query, self.k)
+        if self.mode == "lexical":
+            return self._lexical_search(query, self.k)
+        rankings = [self._dense_search(query, self.fetch_k), self._lexical_search(query, self.fetch_k)]
+        return reciprocal_rank_fusion(rankings, self.rrf_k)[:self.k]
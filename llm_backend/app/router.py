@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.agents import DocAgent
+from app.embedding_service import get_embedding_service
+from app.utils import config
+
+DATASOURCES = ("transcript", "comments", "both")
+
+class LLMDatasourceRouter:
+    """Grammar-constrained LLM choice between the datasources, always confident"""
+    def route(self, question):
+        question_router = DocAgent()
+        return question_router.datasource({"question": question}).lower(), 1.0
+
+class EmbeddingDatasourceRouter:
+    """
+    Nearest-prototype classifier on top of the shared embedding model.
+
+    Each datasource is described by a few example questions. A question goes to the
+    datasource of its most similar prototype; the confidence is the similarity margin
+    between the best and the second best datasource.
+    """
+    def __init__(self, prototypes):
+        self.prototypes = prototypes
+        self._labels = None
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _load_prototypes(self):
+        with self._lock:
+            if self._matrix is None:
+                labels = [label for label, questions in self.prototypes.items() for _ in questions]
+                questions = [question for questions in self.prototypes.values() for question in questions]
+                self._matrix = np.asarray(get_embedding_service().embed_documents(questions), dtype=np.float32)
+                self._labels = np.asarray(labels)
+        return self._labels, self._matrix
+
+    def route(self, question):
+        labels, matrix = self._load_prototypes()
+        embedding = np.asarray(get_embedding_service().embed_query(question), dtype=np.float32)
+        similarities = matrix @ embedding
+        scores = sorted(((similarities[labels == label].max(), label) for label in self.prototypes), reverse=True)
+        return scores[0][1], float(scores[0][0] - scores[1][0])
+
+class DatasourceRouter:
+    """
+    Decides which datasource answers a question.
+
+    The configured backend decides first. Decisions below `min_confidence` fall back
+    to the LLM router, and every decision is memoized per (session, question).
+    """
+    backends = {
+        "embedding": lambda router_config: EmbeddingDatasourceRouter(router_config['prototypes']),
+        "llm": lambda router_config: LLMDatasourceRouter(),
+    }
+
+    def __init__(self, router_config):
+        self.backend = self.backends[router_config['backend']](router_config)
+        self.fallback = LLMDatasourceRouter()
+        self.min_confidence = router_config['min_confidence']
+        self.cache_size = router_config['cache_size']
+        self._decisions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def route(self, session_id, question):
+        key = (session_id, question.strip().lower())
+        with self._lock:
+            if key in self._decisions:
+                self._decisions.move_to_end(key)
+                return self._decisions[key]
+
+        start = time.perf_counter()
+        target, confidence = self.backend.route(question)
+        if confidence < self.min_confidence or target not in DATASOURCES:
+            print(f"---LOW CONFIDENCE ROUTE ({target}, {confidence:.3f}), ASKING THE LLM---")
+            target, confidence = self.fallback.route(question)
+        print(f"---ROUTED TO {target} IN {(time.perf_counter() - start) * 1000:.0f}ms---")
+
+        with self._lock:
+            self._decisions[key] = target
+            while len(self._decisions) > self.cache_size:
+                self._decisions.popitem(last=False)
+        return target
+
+datasource_router = DatasourceRouter(config['router'])
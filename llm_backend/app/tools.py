@@ -1,8 +1,8 @@
 from langchain_core.tools import StructuredTool, ToolException
 from langchain.schema.document import Document
-from langchain_community.vectorstores import Chroma
-from app.database import ChatSessionManager
-from app.llm_chain import create_bge_embeddings
+from app.database import ChatSessionManager, get_collection_name
+from app.llm_chain import create_bge_embeddings, load_vectordb
+from app.retriever import SessionRetriever, RETRIEVAL_MODES
 from app.utils import config
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
@@ -14,36 +14,127 @@ def get_text_chunks(text):
     )
     return splitter.split_text(text)
 
+def build_session_documents(transcript=None, comments=None):
+    documents = []
+    if transcript:
+        for chunk in get_text_chunks(transcript):
+            documents.append(Document(page_content=chunk, metadata={"source": "transcript"}))
+    
+    if comments:
+        reformatted_comments = "\n".join(
+            f"{comment['author']} ({comment['published_at']}): {comment['text']} [Likes: {comment['like_count']}]"
+            for comment in comments)
+        for chunk in get_text_chunks(reformatted_comments):
+            documents.append(Document(page_content=chunk, metadata={"source": "comments"}))
+    return documents
+
+def load_session_documents(session_id):
+    session_manager = ChatSessionManager(session_id=session_id)
+    transcript = session_manager.get_transcript_from_db()
+    comments = session_manager.get_comments_from_db()
+    # The getters return a placeholder message when the session has no data
+    if transcript == "No transcript to show":
+        transcript = None
+    if not isinstance(comments, list):
+        comments = None
+    return build_session_documents(transcript, comments)
+
+def get_retrieval_mode():
+    mode = config['retrieval']['mode']
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}.")
+    return mode
+
+def to_lexical_chunks(documents):
+    return [(document.page_content, document.metadata["source"]) for document in documents]
+
+def index_session_documents(session_id, replace_existing=False):
+    """
+    Indexes the documents stored for a session into its FTS5 index and, unless the
+    retrieval mode is lexical, embeds them into its persistent Chroma collection.
+
+    The indexes are built once at ingest time; they are only rebuilt when the session
+    documents are replaced.
+
+    Args:
+        session_id (str): session key of the video
+        replace_existing (bool): drop the current indexes before indexing
+
+    Returns:
+        Chroma: vectorstore of the session, None in lexical mode
+    """
+    documents = None
+    chat_manager = ChatSessionManager(session_id)
+    if replace_existing or not chat_manager.has_lexical_chunks():
+        documents = load_session_documents(session_id)
+        chat_manager.add_lexical_chunks(to_lexical_chunks(documents), replace_existing=True)
+    if get_retrieval_mode() == "lexical":
+        return None
+
+    embeddings = create_bge_embeddings()
+    collection_name = get_collection_name(session_id)
+    vectordb = load_vectordb(embeddings, collection_name)
+    if replace_existing:
+        vectordb.delete_collection()
+        vectordb = load_vectordb(embeddings, collection_name)
+    elif vectordb._collection.count() > 0:
+        print(f"Vector index already built for session {session_id}.")
+        return vectordb
+
+    if documents is None:
+        documents = load_session_documents(session_id)
+    if documents:
+        vectordb.add_documents(documents)
+    print(f"{len(documents)} chunks indexed for session {session_id}.")
+    return vectordb
+
+def index_new_comments(session_id, comments):
+    """
+    Indexes only the chunks of newly appended comments into the session indexes.
+
+    Args:
+        session_id (str): session key of the video
+        comments (list[dict]): comments appended by ChatSessionManager.append_comments
+
+    Returns:
+        int: number of chunks added
+    """
+    documents = build_session_documents(comments=comments)
+    chat_manager = ChatSessionManager(session_id)
+    if chat_manager.has_lexical_chunks():
+        chat_manager.add_lexical_chunks(to_lexical_chunks(documents))
+    if get_retrieval_mode() != "lexical":
+        vectordb = load_vectordb(create_bge_embeddings(), get_collection_name(session_id))
+        if vectordb._collection.count() > 0 and documents:
+            vectordb.add_documents(documents)
+    # Indexes never built are built from the stored session, new comments included
+    index_session_documents(session_id)
+    print(f"{len(documents)} new chunks indexed for session {session_id}.")
+    return len(documents)
+
 def retrieve_documents(target: str, session_id: str):
     try:
-        session_manager = ChatSessionManager(session_id=session_id)
-        
-        transcript, comments = None, None
-        if target == "transcript" or target == "both":
-            transcript = session_manager.get_transcript_from_db()
-        if target == "comments" or target == "both":
-            comments = session_manager.get_comments_from_db()
-        
-        documents = []
-        if transcript:
-            for chunk in get_text_chunks(transcript):
-                documents.append(Document(page_content=chunk, metadata={"source": "transcript"}))
-        
-        if comments:
-            reformatted_comments = "\n".join(
-                f"{comment['author']} ({comment['published_at']}): {comment['text']} [Likes: {comment['like_count']}]"
-                for comment in comments)
-            for chunk in get_text_chunks(reformatted_comments):
-                documents.append(Document(page_content=chunk, metadata={"source": "comments"}))
-        
-        vectorstore = Chroma.from_documents(
-            documents=documents,
-            collection_name=f"rag-chroma-{session_id}",
-            embedding=create_bge_embeddings(),
+        mode = get_retrieval_mode()
+        vectordb = None
+        if mode != "lexical":
+            vectordb = load_vectordb(create_bge_embeddings(), get_collection_name(session_id))
+            if vectordb._collection.count() == 0:
+                # Sessions ingested before the index was built at ingest time
+                vectordb = index_session_documents(session_id)
+        if mode != "dense" and not ChatSessionManager(session_id).has_lexical_chunks():
+            # Sessions ingested before the FTS5 index existed
+            index_session_documents(session_id)
+
+        retrieval_config = config['retrieval']
+        return SessionRetriever(
+            session_id=session_id,
+            source=target if target in ("transcript", "comments") else None,
+            mode=mode,
+            vectordb=vectordb,
+            k=retrieval_config['k'],
+            fetch_k=retrieval_config['fetch_k'],
+            rrf_k=retrieval_config['rrf_k'],
         )
-        retriever = vectorstore.as_retriever()
-        
-        return retriever
 
     except Exception as e:
         raise ToolException(f"Failed to retrieve documents for session {session_id}: {str(e)}")
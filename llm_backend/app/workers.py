@@ -0,0 +1,40 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.utils import config
+
+class WorkerPool:
+    """
+    Dedicated thread pool with a bounded request queue.
+
+    Blocking work (llama.cpp, torch, bulk SQLite writes) is dispatched here so the
+    event loop stays free for the cheap endpoints. Once `max_workers + max_queue_size`
+    requests are running or waiting, new ones are rejected with a 503.
+    """
+    def __init__(self, name, max_workers=1, max_queue_size=16):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue_size)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(status_code=503, detail=f"Too many {self.name} requests queued, try again later.")
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+def create_worker_pool(name):
+    pool_config = config['workers'][name]
+    return WorkerPool(name, pool_config['max_workers'], pool_config['max_queue_size'])
+
+inference_pool = create_worker_pool("inference")
+sentiment_pool = create_worker_pool("sentiment")
+ingestion_pool = create_worker_pool("ingestion")
@@ -0,0 +1,221 @@
+"""
+Offline benchmark of the backend components with a deterministic stub LLM.
+
+Every agent gets a StubLLM that sleeps `--llm-latency-ms` per call and answers with the
+scripted `--scores`, so the graph timings minus the stubbed model time give the backend's
+own overhead (orchestration, SQLite, splitting, embedding, retrieval, JSON parsing).
+Synthetic sessions of increasing size are stored in a temporary database and Chroma
+directory; the real embedding and sentiment models are used unless stubbed or skipped.
+
+Components:
+    database   ChatSessionManager ingest and reads
+    split      chunking of the transcript and comments
+    retrieval  indexing and retrieve_documents queries (mode of --retrieval-mode), with
+               --background-sessions other videos in the lexical index
+    graph      graph_app runs with the stub LLM
+    sentiment  run_sentimental_analysis_model over the comments
+
+Usage (from llm_backend/):
+    python -m benchmarks.bench_components --sizes 100 1000 10000 --stub-embeddings --output results.json
+"""
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from benchmarks.results import write_results
+from benchmarks.stubs import StubScript, install_stub_llm, install_stub_embeddings
+
+COMPONENTS = ["database", "split", "retrieval", "graph", "sentiment"]
+VOCABULARY = ("video model data training network layer python music guitar camera light "
+              "review price battery screen game level player story question answer great "
+              "bad love hate good funny boring fast slow thanks subscribe").split()
+QUESTIONS = [
+    "What does the video say about the battery?",
+    "Do the comments like the camera?",
+    "Which game level is the hardest?",
+    "What is the price of the model?",
+]
+
+def use_temp_storage(tmp_dir):
+    """Point the SQLite databases and the Chroma directory into tmp_dir before first use"""
+    import app.utils
+    import app.llm_chain
+    db_path = os.path.join(tmp_dir, "chat_sessions", "bench.db")
+    for config in (app.utils.config, app.llm_chain.config):
+        config["chat_sessions_database_path"] = db_path
+        config["chat_sessions_database_string"] = f"sqlite:///{db_path}"
+        config["chromadb"]["chromadb_path"] = os.path.join(tmp_dir, "chroma_db")
+        config["embedding_cache"]["path"] = os.path.join(tmp_dir, "embedding_cache", "embeddings.db")
+
+def synthetic_words(rng, n_words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(n_words))
+
+def synthetic_session(rng, n_comments, words_per_comment=20):
+    # The transcript grows with the session size as well: half as many words as the comments
+    transcript = ". ".join(synthetic_words(rng, 12) for _ in range(max(n_comments * words_per_comment // 24, 1)))
+    comments = [{
+        "author": f"author {i}",
+        "text": synthetic_words(rng, words_per_comment),
+        "published_at": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T00:00:00Z",
+        "like_count": rng.randrange(100),
+    } for i in range(n_comments)]
+    return transcript, comments
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def summarize_ms(samples):
+    return {
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": statistics.median(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+def bench_database(session_id, transcript, comments, repeats):
+    from app.database import ChatSessionManager
+    manager = ChatSessionManager(session_id)
+    _, session_seconds = timed(manager.add_video_session, "title", f"https://youtu.be/{session_id}",
+                               "channel", "description", "2024-01-01", "PT10M", True)
+    _, ingest_seconds = timed(manager.add_documents_to_db, transcript, comments, True)
+    transcript_reads = [timed(manager.get_transcript_from_db)[1] for _ in range(repeats)]
+    comment_reads = [timed(manager.get_comments_from_db)[1] for _ in range(repeats)]
+    return {
+        "add_video_session_ms": session_seconds * 1000,
+        "add_documents_ms": ingest_seconds * 1000,
+        "comments_per_second": len(comments) / ingest_seconds if ingest_seconds else None,
+        "get_transcript_from_db": summarize_ms(transcript_reads),
+        "get_comments_from_db": summarize_ms(comment_reads),
+    }
+
+def bench_split(transcript, comments):
+    from app.tools import build_session_documents
+    documents, seconds = timed(build_session_documents, transcript, comments)
+    return {"chunks": len(documents), "split_ms": seconds * 1000}
+
+def add_background_sessions(rng, n_sessions, n_comments):
+    """Fill the lexical index with other videos, so lookups are measured against a shared index"""
+    from app.database import ChatSessionManager
+    from app.tools import build_session_documents, to_lexical_chunks
+    for i in range(n_sessions):
+        documents = build_session_documents(*synthetic_session(rng, n_comments))
+        ChatSessionManager(f"background_{i}").add_lexical_chunks(to_lexical_chunks(documents))
+
+def bench_retrieval(session_id, repeats):
+    from app.database import get_connection
+    from app.tools import index_session_documents, retrieve_documents
+    _, index_seconds = timed(index_session_documents, session_id, True)
+    n_chunks = get_connection().execute("SELECT COUNT(*) FROM lexical_chunks WHERE session_key = ?",
+                                        (session_id,)).fetchone()[0]
+    queries = {}
+    for target in ("transcript", "comments", "both"):
+        samples = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            retrieve_documents(target, session_id).invoke(QUESTIONS[i % len(QUESTIONS)])
+            samples.append(time.perf_counter() - start)
+        queries[target] = summarize_ms(samples)
+    return {
+        "chunks": n_chunks,
+        "index_ms": index_seconds * 1000,
+        "chunks_per_second": n_chunks / index_seconds if index_seconds else None,
+        "retrieve": queries,
+    }
+
+def bench_graph(session_id, script, runs):
+    from app.build_graph import graph_app
+    from app.graph_state import create_graph_inputs
+    samples, overheads, llm_calls = [], [], []
+    for i in range(runs):
+        script.reset()
+        start = time.perf_counter()
+        graph_app.invoke(create_graph_inputs(QUESTIONS[i % len(QUESTIONS)], session_id))
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        llm_calls.append(script.calls)
+        overheads.append(elapsed - script.calls * script.latency_ms / 1000)
+    return {
+        "runs": runs,
+        "llm_calls_per_run": statistics.mean(llm_calls),
+        "latency": summarize_ms(samples),
+        "overhead": summarize_ms(overheads),
+    }
+
+def bench_sentiment(comments, max_phrases):
+    from app.model_manager import run_sentimental_analysis_model
+    phrases = [comment["text"] for comment in comments[:max_phrases]]
+    scores, seconds = timed(run_sentimental_analysis_model, phrases)
+    if "error" in scores:
+        return {"error": scores["error"]}
+    return {"phrases": len(phrases), "seconds": seconds, "phrases_per_second": len(phrases) / seconds}
+
+def run(size, components, script, args, rng):
+    session_id = f"bench_{size}"
+    transcript, comments = synthetic_session(rng, size)
+    result = {"comments": size, "transcript_words": len(transcript.split())}
+    # Later components read the session from the database, so it is always ingested
+    database = bench_database(session_id, transcript, comments, args.repeats)
+    if "database" in components:
+        result["database"] = database
+    if "split" in components:
+        result["split"] = bench_split(transcript, comments)
+    if "retrieval" in components or "graph" in components:
+        retrieval = bench_retrieval(session_id, args.repeats)
+        if "retrieval" in components:
+            result["retrieval"] = retrieval
+    if "graph" in components:
+        result["graph"] = bench_graph(session_id, script, args.graph_runs)
+    if "sentiment" in components:
+        result["sentiment"] = bench_sentiment(comments, args.max_sentiment_phrases)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="number of comments of each synthetic session")
+    parser.add_argument("--components", nargs="+", choices=COMPONENTS, default=COMPONENTS)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--scores", default="yes",
+                        help="comma separated yes/no answers given in turn to every grader call")
+    parser.add_argument("--target", default="both", choices=["transcript", "comments", "both"])
+    parser.add_argument("--stub-embeddings", action="store_true",
+                        help="use hashed bag-of-words vectors instead of the embedding model")
+    parser.add_argument("--retrieval-mode", choices=["dense", "lexical", "hybrid"],
+                        help="override retrieval.mode of config.yaml")
+    parser.add_argument("--background-sessions", type=int, default=0,
+                        help="other videos added to the lexical index before the retrieval benchmark")
+    parser.add_argument("--background-comments", type=int, default=200,
+                        help="comments of each background video")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--graph-runs", type=int, default=10)
+    parser.add_argument("--max-sentiment-phrases", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file for the results, stdout by default")
+    args = parser.parse_args()
+
+    script = StubScript(scores=args.scores.split(","), target=args.target, latency_ms=args.llm_latency_ms)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        use_temp_storage(tmp_dir)
+        if args.retrieval_mode:
+            import app.utils
+            app.utils.config["retrieval"]["mode"] = args.retrieval_mode
+        install_stub_llm(script)
+        if args.stub_embeddings:
+            install_stub_embeddings()
+        # The app logs with print: keep stdout for the JSON results
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.background_sessions:
+                add_background_sessions(rng, args.background_sessions, args.background_comments)
+            results = [run(size, args.components, script, args, rng) for size in args.sizes]
+
+    settings = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("components", settings, results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compare the cross-encoder reranker with the LLM document grader.
+
+Both graders see the same (question, documents) samples. The harness reports the
+grading latency per question of each one and the agreement of the reranker with the
+LLM grader (accuracy and Cohen's kappa) at several thresholds, plus the accuracy of
+both against human labels when the samples have them. Needs the GGUF model and the
+reranker model.
+
+Samples come from a JSONL file, one object per line:
+    {"question": "...", "document": "...", "label": "yes"}   (label is optional)
+or are retrieved from an ingested session:
+    --video-url https://www.youtube.com/watch?v=... --questions "..." "..."
+
+Usage (from llm_backend/):
+    python -m benchmarks.bench_reranker --samples samples.jsonl --thresholds 0.3 0.5 0.7
+"""
+import argparse
+import contextlib
+import json
+import statistics
+import sys
+import time
+from langchain.schema.document import Document
+from benchmarks.results import write_results
+
+def load_samples(path):
+    questions = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            sample = json.loads(line)
+            questions.setdefault(sample["question"], []).append(
+                (Document(page_content=sample["document"]), sample.get("label")))
+    return questions
+
+def retrieve_samples(video_url, questions):
+    from app.tools import retrieve_documents
+    from app.utils import generate_valid_session_id
+    session_id = generate_valid_session_id(video_url)
+    return {question: [(document, None) for document in retrieve_documents("both", session_id).invoke(question)]
+            for question in questions}
+
+def llm_grades(question, documents, mode):
+    from app.agents import BatchGraderDocsAgent, GraderDocsAgent
+    if mode == "batch":
+        try:
+            return BatchGraderDocsAgent(n_documents=len(documents)).grade_docs({
+                "documents": "\n\n".join(f"Document {i}:\n{d.page_content}" for i, d in enumerate(documents, 1)),
+                "question": question
+            })
+        except ValueError as e:
+            print(f"Batch grading failed ({str(e)}), grading each document")
+    grader = GraderDocsAgent()
+    return [grader.grade_doc({"document": d.page_content, "question": question}) for d in documents]
+
+def agreement(grades, reference):
+    """
+    Returns:
+        dict: accuracy and Cohen's kappa of `grades` against `reference` ("yes"/"no" lists)
+    """
+    n = len(grades)
+    observed = sum(a == b for a, b in zip(grades, reference)) / n
+    yes_a = sum(grade == "yes" for grade in grades) / n
+    yes_b = sum(grade == "yes" for grade in reference) / n
+    expected = yes_a * yes_b + (1 - yes_a) * (1 - yes_b)
+    kappa = (observed - expected) / (1 - expected) if expected < 1 else 1.0
+    return {"accuracy": observed, "kappa": kappa, "yes_rate": yes_a}
+
+def latency_summary(samples):
+    return {"mean_ms": statistics.mean(samples) * 1000, "p50_ms": statistics.median(samples) * 1000,
+            "max_ms": max(samples) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="JSONL file with question, document and optional label")
+    parser.add_argument("--video-url", help="retrieve the documents of an ingested session instead")
+    parser.add_argument("--questions", nargs="+", default=[])
+    parser.add_argument("--llm-mode", choices=["batch", "per_document"], default="batch")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3, 0.5, 0.7])
+    parser.add_argument("--output", help="JSON file for the results, stdout by default")
+    args = parser.parse_args()
+    if not args.samples and not (args.video_url and args.questions):
+        parser.error("pass --samples or --video-url with --questions")
+
+    from app.reranker import get_reranker
+    llm_times, reranker_times = [], []
+    all_llm, all_scores, all_labels = [], [], []
+    # The app logs with print: keep stdout for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        samples = load_samples(args.samples) if args.samples else retrieve_samples(args.video_url, args.questions)
+        reranker = get_reranker()
+        for question, pairs in samples.items():
+            documents = [document for document, _ in pairs]
+            start = time.perf_counter()
+            grades = [grade.lower() for grade in llm_grades(question, documents, args.llm_mode)]
+            llm_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            scores = reranker.score(question, documents)
+            reranker_times.append(time.perf_counter() - start)
+            all_llm.extend(grades)
+            all_scores.extend(scores)
+            all_labels.extend(label for _, label in pairs)
+
+    labelled = [i for i, label in enumerate(all_labels) if label is not None]
+    thresholds = []
+    for threshold in args.thresholds:
+        reranker_grades = ["yes" if score >= threshold else "no" for score in all_scores]
+        result = {"threshold": threshold, "vs_llm": agreement(reranker_grades, all_llm)}
+        if labelled:
+            result["vs_labels"] = agreement([reranker_grades[i] for i in labelled],
+                                            [all_labels[i] for i in labelled])
+        thresholds.append(result)
+
+    results = {
+        "questions": len(samples),
+        "documents": len(all_scores),
+        "llm_latency_per_question": latency_summary(llm_times),
+        "reranker_latency_per_question": latency_summary(reranker_times),
+        "thresholds": thresholds,
+    }
+    if labelled:
+        results["llm_vs_labels"] = agreement([all_llm[i] for i in labelled], [all_labels[i] for i in labelled])
+    settings = {"model_name": reranker.model_name, "llm_mode": args.llm_mode,
+                "samples": args.samples, "video_url": args.video_url}
+    write_results("reranker", settings, [results], args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Session lookup benchmark before and after the session_key indexes (schema v1 vs v2).
+
+Fills a temporary database with synthetic sessions and times the queries that
+ChatSessionManager runs for one session, first on the v1 schema (no indexes) and
+then after migrating the same file to the latest version.
+
+Usage (from llm_backend/):
+    python -m benchmarks.bench_session_lookups --sessions 1000 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from app.database import apply_migrations, apply_pragmas
+from benchmarks.results import write_results
+
+# Same statements as ChatSessionManager and SQLChatMessageHistory
+LOOKUPS = {
+    "get_transcript_from_db": "SELECT content FROM transcript WHERE session_key = ?",
+    "get_comments_from_db": "SELECT author, content, published_at, like_count FROM comments WHERE session_key = ?",
+    "load_messages_from_db": "SELECT sender_type, content FROM chat_history WHERE session_key = ? ORDER BY id",
+    "get_chat_history": "SELECT id, session_id, message FROM message_store WHERE session_id = ? ORDER BY id",
+}
+
+def populate(conn, n_sessions, comments_per_session, messages_per_session):
+    with conn:
+        for i in range(n_sessions):
+            session_key = f"session_{i:032d}"
+            conn.execute("INSERT INTO transcript (session_key, content) VALUES (?, ?)",
+                         (session_key, f"transcript {i}"))
+            conn.executemany(
+                "INSERT INTO comments (session_key, author, content, published_at, like_count) VALUES (?, ?, ?, ?, ?)",
+                [(session_key, f"author {j}", f"comment {j}", f"2024-01-{j % 28 + 1:02d}T00:00:00Z", j)
+                 for j in range(comments_per_session)]
+            )
+            conn.executemany(
+                "INSERT INTO chat_history (session_key, sender_type, content) VALUES (?, ?, ?)",
+                [(session_key, "human" if j % 2 == 0 else "ai", f"message {j}") for j in range(messages_per_session)]
+            )
+            conn.executemany(
+                "INSERT INTO message_store (session_id, message) VALUES (?, ?)",
+                [(session_key, f'{{"type": "human", "data": {{"content": "message {j}"}}}}')
+                 for j in range(messages_per_session)]
+            )
+
+def time_lookups(conn, n_sessions, n_queries):
+    sample = [f"session_{random.randrange(n_sessions):032d}" for _ in range(n_queries)]
+    results = {}
+    for name, query in LOOKUPS.items():
+        start = time.perf_counter()
+        for session_key in sample:
+            conn.execute(query, (session_key,)).fetchall()
+        results[name] = (time.perf_counter() - start) / n_queries * 1000
+    return results
+
+def run(n_sessions, comments_per_session, messages_per_session, n_queries):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(os.path.join(tmp_dir, "bench.db"))
+        apply_pragmas(conn)
+        apply_migrations(conn, target_version=1)
+        # message_store is created by SQLChatMessageHistory on v1 databases
+        conn.execute("CREATE TABLE message_store (id INTEGER NOT NULL PRIMARY KEY, session_id TEXT, message TEXT)")
+        populate(conn, n_sessions, comments_per_session, messages_per_session)
+
+        before = time_lookups(conn, n_sessions, n_queries)
+        start = time.perf_counter()
+        apply_migrations(conn)
+        migration_seconds = time.perf_counter() - start
+        after = time_lookups(conn, n_sessions, n_queries)
+        conn.close()
+
+    return {
+        "sessions": n_sessions,
+        "migration_seconds": migration_seconds,
+        "lookups_ms": {name: {"v1": before[name], "latest": after[name]} for name in LOOKUPS},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--comments-per-session", type=int, default=20)
+    parser.add_argument("--messages-per-session", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    results = [run(n, args.comments_per_session, args.messages_per_session, args.queries) for n in args.sessions]
+    if args.json or args.output:
+        settings = {key: value for key, value in vars(args).items() if key not in ("json", "output")}
+        write_results("session_lookups", settings, results, args.output)
+        return
+
+    for result in results:
+        print(f"\n{result['sessions']} sessions (migration took {result['migration_seconds']:.2f}s)")
+        print(f"{'lookup':<24}{'v1 ms':>12}{'latest ms':>12}{'speedup':>10}")
+        for name, timings in result["lookups_ms"].items():
+            speedup = timings["v1"] / timings["latest"] if timings["latest"] else float("inf")
+            print(f"{name:<24}{timings['v1']:>12.3f}{timings['latest']:>12.3f}{speedup:>9.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(benchmark, settings, results, output=None):
+    """
+    Write the results with the commit and environment they were measured on, so runs
+    of different commits can be compared.
+
+    Args:
+        benchmark (str): name of the benchmark
+        settings (dict): parameters of the run
+        results (list): measurements
+        output (str): JSON file path, stdout when None
+    """
+    payload = {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": results,
+    }
+    if output is None:
+        print(json.dumps(payload, indent=2))
+        return
+    with open(output, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
@@ -0,0 +1,125 @@
+"""
+Deterministic stand-ins for the models, so the backend can be benchmarked without the GGUF files.
+
+StubLLM answers every agent from a StubScript according to the grammar it was created with:
+the datasource router gets `{"target": ...}`, the graders get the scripted yes/no scores in
+order and free-form agents (generation, query rewriting) get a fixed answer. Each call sleeps
+`latency_ms` to emulate model time, which the benchmarks subtract to report backend overhead.
+"""
+import hashlib
+import itertools
+import re
+import threading
+import time
+from typing import Any, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+
+class StubScript:
+    def __init__(self, scores=("yes",), target="both", answer="This is a stub answer.", latency_ms=0.0):
+        self.scores = list(scores)
+        self.target = target
+        self.answer = answer
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._scores = itertools.cycle(self.scores)
+            self.calls = 0
+
+    def next_score(self):
+        with self._lock:
+            return next(self._scores)
+
+    def respond(self, grammar_path, prompt):
+        with self._lock:
+            self.calls += 1
+        if grammar_path is None:
+            return self.answer
+        if "target" in grammar_path:
+            return f'{{"target": "{self.target}"}}'
+        if "score_list" in grammar_path:
+            n_documents = len(re.findall(r"Document \d+:\n", prompt))
+            return "[" + ", ".join(f'{{"score": "{self.next_score()}"}}' for _ in range(n_documents)) + "]"
+        return f'{{"score": "{self.next_score()}"}}'
+
+class StubTokenizer:
+    """Whitespace tokenizer with the llama.cpp `tokenize` signature used by ContextPacker"""
+    def tokenize(self, text, add_bos=True):
+        return list(range(len(text.decode("utf-8").split()) + int(add_bos)))
+
+class StubLLM(LLM):
+    script: Any
+    grammar_path: Optional[str] = None
+    temperature: float = 0.1
+    stop: List[str] = []
+    max_tokens: int = 256
+    n_ctx: int = 2048
+    streaming: bool = False
+    client: Any = None
+    last_usage: Any = None
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.script.latency_ms / 1000)
+        response = self.script.respond(self.grammar_path, prompt)
+        if run_manager and self.streaming:
+            run_manager.on_llm_new_token(response)
+        # Usage as the pooled LlamaCpp reports it
+        self.last_usage = {
+            "prompt_tokens": len(self.client.tokenize(prompt.encode("utf-8"))),
+            "completion_tokens": len(self.client.tokenize(response.encode("utf-8"), add_bos=False)),
+        }
+        return response
+
+class StubEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors: deterministic, fast and still ranking chunks that share
+    words with the query first.
+    """
+    model_name = "stub-hashed-bow"
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+def install_stub_llm(script):
+    """
+    Replace `create_llm` wherever it was imported so every agent gets a StubLLM
+    """
+    import app.llm_chain
+    import app.agents
+    import app.graph_state
+
+    def create_stub_llm(model_path=None, temperature=0.1, stop=[], grammar_path=None, max_tokens=256,
+                        streaming=False):
+        return StubLLM(script=script, grammar_path=grammar_path, temperature=temperature,
+                       stop=stop, max_tokens=max_tokens, streaming=streaming, client=StubTokenizer())
+
+    for module in (app.llm_chain, app.agents, app.graph_state):
+        module.create_llm = create_stub_llm
+
+def install_stub_embeddings():
+    """
+    Replace the process-wide embedding service used by indexing, retrieval, routing and the answer cache
+    """
+    import app.embedding_service
+    app.embedding_service._embedding_service = StubEmbeddings()
@@ -0,0 +1,46 @@
+"""
+Streaming events of run_graph with the stub LLM of the benchmarks (no GGUF model needed).
+
+Run from llm_backend/:
+    python -m pytest tests
+"""
+import queue
+import random
+import pytest
+from benchmarks.bench_components import use_temp_storage, synthetic_session
+from benchmarks.stubs import StubScript, install_stub_llm, install_stub_embeddings
+
+ANSWER = "The battery lasts two days."
+
+@pytest.fixture(scope="module")
+def session_id(tmp_path_factory):
+    use_temp_storage(str(tmp_path_factory.mktemp("storage")))
+    install_stub_llm(StubScript(scores=("yes",), answer=ANSWER))
+    install_stub_embeddings()
+    from app.answer_cache import answer_cache
+    from app.database import ChatSessionManager
+    from app.tools import index_session_documents
+    answer_cache.enabled = False
+    session_id = "test_stream"
+    transcript, comments = synthetic_session(random.Random(0), 20)
+    manager = ChatSessionManager(session_id)
+    manager.add_video_session("title", f"https://youtu.be/{session_id}", "channel", "description",
+                              "2024-01-01", "PT10M", True)
+    manager.add_documents_to_db(transcript, comments, True)
+    index_session_documents(session_id, True)
+    return session_id
+
+def collect_events(question, session_id):
+    from app.graph_runner import run_graph
+    events = queue.Queue()
+    result = run_graph(question, session_id, events)
+    return result, [events.get() for _ in range(events.qsize())]
+
+def test_only_the_answer_is_streamed(session_id):
+    result, events = collect_events("What does the video say about the battery?", session_id)
+    assert result["response"] == ANSWER
+    assert [event["event"] for event in events].count("generation_start") == 1
+    # Graders and the router run on the same model: none of their JSON reaches the stream
+    tokens = "".join(event["token"] for event in events if event["event"] == "token")
+    assert tokens == ANSWER
+    assert "score" not in tokens